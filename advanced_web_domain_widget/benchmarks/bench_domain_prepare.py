@@ -0,0 +1,166 @@
+#!/usr/bin/env python3
+"""
+Micro-benchmarks of the helpers of ``models/domain_prepare.py``:
+
+* ``prepare_domain_v2`` for every ``date_filter`` token, with the windows of
+  the day cached or not,
+* ``compute_domain`` on dotted field paths of depth 1 to 4,
+* both applied to every leaf of domains of 1 to 1,000 leaves, the way the
+  access domains of ``ir.rule._compute_domain`` are prepared,
+* ``get_date_bucket``.
+
+Each case reports the median time per call and the SQL queries per call.
+Run it with the Odoo sources importable, against a database having the
+module installed::
+
+    bench_domain_prepare.py -c odoo.conf -d mydb --record   # store the baselines
+    bench_domain_prepare.py -c odoo.conf -d mydb            # compare to them
+
+Baselines go to ``baselines/<name>.json`` next to this script, ``--name``
+defaulting to the host name since timings only compare on one machine. A
+case fails the comparison when it gets slower than ``--tolerance`` times its
+baseline or runs more queries than it: the queries do not depend on the
+machine.
+"""
+import argparse
+import datetime
+import json
+import os
+import socket
+import statistics
+import sys
+import timeit
+
+import odoo
+from odoo import api, SUPERUSER_ID
+from odoo.addons.advanced_web_domain_widget.models.domain_prepare import (
+    DATE_FILTER_TOKENS, compute_domain, date_filter_windows, get_date_bucket, prepare_domain_v2,
+)
+
+BASELINE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'baselines')
+
+# dotted paths on res.partner, the last hop reaching res.users or res.company
+# so that compute_domain has a 0 to replace
+FIELD_PATHS = {
+    1: 'user_id',
+    2: 'parent_id.user_id',
+    3: 'parent_id.user_id.company_id',
+    4: 'parent_id.commercial_partner_id.user_id.company_id',
+}
+DOMAIN_SIZES = (1, 10, 100, 1000)
+# fixed day, so that the windows are the same from one run to the other
+DAY = datetime.date(2024, 5, 15)
+
+
+def leaf(index):
+    """ Leaves of the generated domains: date filters and dotted paths in turn. """
+    if index % 2:
+        return ('create_date', 'date_filter', DATE_FILTER_TOKENS[index % len(DATE_FILTER_TOKENS)])
+    return (FIELD_PATHS[index % 4 + 1], 'in', [0])
+
+
+def prepare_domain(env, domain):
+    """ Prepare ``domain`` as the access domains are in ``ir.rule``. """
+    result = []
+    for dom_tuple in domain:
+        compute_domain(dom_tuple, 'res.partner', env)
+        if dom_tuple[1] == 'date_filter':
+            result += prepare_domain_v2(dom_tuple, DAY)
+        else:
+            result.append(dom_tuple)
+    return result
+
+
+def cases(env):
+    """ ``{name: callable}`` of the benchmarked calls. """
+    result = {}
+    for token in DATE_FILTER_TOKENS:
+        domain = ('create_date', 'date_filter', token)
+        result['prepare_domain_v2/%s' % token] = lambda domain=domain: prepare_domain_v2(domain, DAY)
+
+        def cold(domain=domain):
+            date_filter_windows.cache_clear()
+            prepare_domain_v2(domain, DAY)
+        result['prepare_domain_v2/%s/cold' % token] = cold
+    for depth, path in FIELD_PATHS.items():
+        # compute_domain replaces the 0 in place, the list is rebuilt each call
+        result['compute_domain/depth_%s' % depth] = lambda path=path: compute_domain((path, 'in', [0]), 'res.partner', env)
+    for size in DOMAIN_SIZES:
+        def prepare(size=size):
+            prepare_domain(env, [leaf(index) for index in range(size)])
+        result['domain/%s_leaves' % size] = prepare
+    result['get_date_bucket'] = lambda: get_date_bucket(env)
+    return result
+
+
+def measure(env, func, min_time):
+    """ Return the median seconds per call and the queries per call of ``func``. """
+    count = env.cr.sql_log_count
+    func()
+    queries = env.cr.sql_log_count - count
+    timer = timeit.Timer(func)
+    number, _elapsed = timer.autorange()
+    number = max(number, int(number * min_time / 0.2))
+    runs = timer.repeat(repeat=5, number=number)
+    return statistics.median(runs) / number, queries
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('-c', '--config', help="Odoo configuration file")
+    parser.add_argument('-d', '--database', required=True)
+    parser.add_argument('--name', default=socket.gethostname(), help="name of the baseline file")
+    parser.add_argument('--record', action='store_true', help="store the results as the baselines")
+    parser.add_argument('--tolerance', type=float, default=1.25, help="slowdown failing a case")
+    parser.add_argument('--min-time', type=float, default=0.2, help="seconds each sample should last at least")
+    parser.add_argument('--filter', default='', help="only run the cases whose name contains this")
+    args = parser.parse_args()
+
+    odoo.tools.config.parse_config(['-c', args.config] if args.config else [])
+    registry = odoo.modules.registry.Registry(args.database)
+    results = {}
+    with registry.cursor() as cr:
+        env = api.Environment(cr, SUPERUSER_ID, {})
+        for name, func in cases(env).items():
+            if args.filter in name:
+                seconds, queries = measure(env, func, args.min_time)
+                results[name] = {'us': seconds * 1e6, 'queries': queries}
+        cr.rollback()
+
+    baseline_path = os.path.join(BASELINE_DIR, '%s.json' % args.name)
+    if args.record:
+        os.makedirs(BASELINE_DIR, exist_ok=True)
+        with open(baseline_path, 'w') as baseline_file:
+            json.dump({'odoo': odoo.release.version, 'python': sys.version.split()[0], 'cases': results},
+                      baseline_file, indent=2, sort_keys=True)
+    baseline = {}
+    if os.path.exists(baseline_path) and not args.record:
+        with open(baseline_path) as baseline_file:
+            baseline = json.load(baseline_file)['cases']
+
+    failures = []
+    print('%-40s %12s %8s %12s %8s' % ('case', 'us/call', 'queries', 'baseline us', 'ratio'))
+    for name, result in results.items():
+        base = baseline.get(name)
+        if not base:
+            print('%-40s %12.2f %8d' % (name, result['us'], result['queries']))
+            continue
+        ratio = result['us'] / base['us'] if base['us'] else 1
+        slower = ratio > args.tolerance
+        more_queries = result['queries'] > base['queries']
+        if slower or more_queries:
+            failures.append(name)
+        print('%-40s %12.2f %8d %12.2f %7.2fx%s' % (
+            name, result['us'], result['queries'], base['us'], ratio,
+            ' REGRESSION' if slower or more_queries else ''))
+    if args.record:
+        print('baselines stored in %s' % baseline_path)
+    elif not baseline:
+        print('no baseline in %s, run with --record first' % baseline_path)
+    if failures:
+        print('%d regression(s): %s' % (len(failures), ', '.join(failures)))
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -1,11 +1,12 @@
 from odoo import fields
 from odoo.http import request
-from datetime import datetime,timedelta
+from datetime import datetime, time, timedelta
 from dateutil.relativedelta import relativedelta
+import functools
 import pytz
 
 
-def compute_domain(domain_tuple,model):
+def compute_domain(domain_tuple,model,env=None):
     """
     This function takes a tuple of a domain and a model name as input. It parses
     the domain and replaces 0 with the current user's ID or the current company's
@@ -15,6 +16,7 @@ def compute_domain(domain_tuple,model):
     
     :param domain_tuple: A tuple of a domain and a model name
     :type domain_tuple: tuple
+    :param env: environment to resolve the fields with, defaults to the request's
     :return: The modified domain
     :rtype: tuple
     """
@@ -24,8 +26,9 @@ def compute_domain(domain_tuple,model):
     left_value_split_list = left_value.split('.')
     left_user = False
     left_company = False
-    field_obj = request.env['ir.model.fields'].sudo()
-    model_obj = request.env[model]._name
+    env = env or request.env
+    field_obj = env['ir.model.fields'].sudo()
+    model_obj = env[model]._name
     for field in left_value_split_list:
         left_user = False
         left_company = False
@@ -44,137 +47,122 @@ def compute_domain(domain_tuple,model):
         if operator_value in ['in', 'not in']:
             if isinstance(right_value, list) and 0 in right_value:
                 zero_index = right_value.index(0)
-                right_value[zero_index] = request.env.user.id
+                right_value[zero_index] = env.user.id
 
     if left_company:
         if operator_value in ['in', 'not in']:
             if isinstance(right_value, list) and 0 in right_value:
                 zero_index = right_value.index(0)
-                right_value[zero_index] = request.env.company.id
+                right_value[zero_index] = env.company.id
                 
-def prepare_domain_v2(domain):
+# Values understood by the ``date_filter`` operator of the domain widget.
+DATE_FILTER_TOKENS = (
+    'today', 'this_week', 'this_month', 'this_quarter', 'this_year',
+    'last_day', 'last_week', 'last_month', 'last_quarter', 'last_year',
+    'last_7_days', 'last_30_days', 'last_90_days', 'last_365_days',
+    'next_day', 'next_week', 'next_month', 'next_quarter', 'next_year',
+)
+
+
+def get_date_bucket(env=None):
+    """
+    Return the current day in the timezone of the user, which is the only
+    input the ``date_filter`` windows depend on.
+    """
+    env = env or request.env
+    tz = pytz.timezone(env.user.tz or 'UTC')
+    return datetime.now(tz).date()
+
+
+def _date_filter_window(val, current_date):
+    quarter_start_month = ((current_date.month - 1) // 3) * 3 + 1
+    if val == "today":
+        return current_date, current_date + timedelta(days=1)
+    if val == "this_week":
+        start_of_week = current_date - timedelta(days=current_date.weekday())
+        return start_of_week, start_of_week + timedelta(days=7)
+    if val == "this_month":
+        start_of_month = current_date.replace(day=1)
+        return start_of_month, start_of_month + relativedelta(months=1)
+    if val == "this_quarter":
+        start_of_quarter = current_date.replace(month=quarter_start_month, day=1)
+        return start_of_quarter, start_of_quarter + relativedelta(months=3)
+    if val == "this_year":
+        start_of_year = current_date.replace(month=1, day=1)
+        return start_of_year, start_of_year + relativedelta(years=1)
+    if val == "last_day":
+        return current_date - timedelta(days=1), current_date
+    if val == "last_week":
+        end_of_last_week = current_date - timedelta(days=current_date.weekday())
+        return end_of_last_week - timedelta(days=7), end_of_last_week
+    if val == "last_month":
+        end_of_last_month = current_date.replace(day=1)
+        return end_of_last_month - relativedelta(months=1), end_of_last_month
+    if val == "last_quarter":
+        end_of_last_quarter = current_date.replace(month=quarter_start_month, day=1)
+        return end_of_last_quarter - relativedelta(months=3), end_of_last_quarter
+    if val == "last_year":
+        return current_date.replace(year=current_date.year - 1, month=1, day=1), current_date.replace(month=1, day=1)
+    if val == "last_7_days":
+        return current_date - timedelta(days=6), None
+    if val == "last_30_days":
+        return current_date - timedelta(days=29), None
+    if val == "last_90_days":
+        return current_date - timedelta(days=89), None
+    if val == "last_365_days":
+        return current_date - timedelta(days=364), None
+    if val == "next_day":
+        start_of_next_day = current_date + timedelta(days=1)
+        return start_of_next_day, start_of_next_day + timedelta(days=1)
+    if val == "next_week":
+        start_of_next_week = current_date + timedelta(days=(7 - current_date.weekday()))
+        return start_of_next_week, start_of_next_week + timedelta(days=7)
+    if val == "next_month":
+        start_of_next_month = current_date.replace(day=1) + relativedelta(months=1)
+        return start_of_next_month, start_of_next_month + relativedelta(months=1)
+    if val == "next_quarter":
+        start_of_next_quarter = current_date.replace(month=quarter_start_month, day=1) + relativedelta(months=3)
+        return start_of_next_quarter, start_of_next_quarter + relativedelta(months=3)
+    if val == "next_year":
+        start_of_next_year = current_date.replace(year=current_date.year + 1, month=1, day=1)
+        return start_of_next_year, start_of_next_year + relativedelta(years=1)
+    return None
+
+
+@functools.lru_cache(maxsize=32)
+def date_filter_windows(day):
+    """
+    Precompute the bounds of every ``date_filter`` token for a given day.
+
+    :param day: the current day in the user timezone, see ``get_date_bucket``
+    :type day: datetime.date
+    :return: ``{token: (start, end)}`` as datetime strings, ``end`` being
+        ``False`` for the open ended windows
+    :rtype: dict
+    """
+    current_date = datetime.combine(day, time.min)
+    windows = {}
+    for val in DATE_FILTER_TOKENS:
+        start, end = _date_filter_window(val, current_date)
+        windows[val] = (fields.Datetime.to_string(start), end and fields.Datetime.to_string(end))
+    return windows
+
+
+def prepare_domain_v2(domain, day=None):
     if isinstance(domain, tuple) or isinstance(domain, list):
         field_name = domain[0]
         operator = domain[1]
         val = domain[2]
 
-        # Initialize timezone
-        user_tz = request.env.user.tz or 'UTC'
-        tz = pytz.timezone(user_tz)
-        current_date = datetime.now(tz).replace(hour=0, minute=0, second=0, microsecond=0)
-
         if operator != "date_filter":
             return [tuple(domain)]
 
-        if val == "today":
-            start_of_today = current_date
-            end_of_today = start_of_today + timedelta(days=1)
-            return ["&", (field_name, ">=", fields.Datetime.to_string(start_of_today)),
-                    (field_name, "<", fields.Datetime.to_string(end_of_today))]
-
-        if val == "this_week":
-            start_of_week = current_date - timedelta(days=current_date.weekday())
-            end_of_week = start_of_week + timedelta(days=7)
-            return ["&", (field_name, ">=", fields.Datetime.to_string(start_of_week)),
-                    (field_name, "<", fields.Datetime.to_string(end_of_week))]
-
-        if val == "this_month":
-            start_of_month = current_date.replace(day=1)
-            end_of_month = start_of_month + relativedelta(months=1)
-            return ["&", (field_name, ">=", fields.Datetime.to_string(start_of_month)),
-                    (field_name, "<", fields.Datetime.to_string(end_of_month))]
-
-        if val == "this_quarter":
-            quarter_start_month = ((current_date.month - 1) // 3) * 3 + 1
-            start_of_quarter = current_date.replace(month=quarter_start_month, day=1)
-            end_of_quarter = start_of_quarter + relativedelta(months=3)
-            return ["&", (field_name, ">=", fields.Datetime.to_string(start_of_quarter)),
-                    (field_name, "<", fields.Datetime.to_string(end_of_quarter))]
-
-        if val == "this_year":
-            start_of_year = current_date.replace(month=1, day=1)
-            end_of_year = start_of_year + relativedelta(years=1)
-            return ["&", (field_name, ">=", fields.Datetime.to_string(start_of_year)),
-                    (field_name, "<", fields.Datetime.to_string(end_of_year))]
-
-        if val == "last_day":
-            start_of_yesterday = current_date - timedelta(days=1)
-            end_of_yesterday = current_date
-            return ["&", (field_name, ">=", fields.Datetime.to_string(start_of_yesterday)),
-                    (field_name, "<", fields.Datetime.to_string(end_of_yesterday))]
-
-        if val == "last_week":
-            end_of_last_week = current_date - timedelta(days=current_date.weekday())
-            start_of_last_week = end_of_last_week - timedelta(days=7)
-            return ["&", (field_name, ">=", fields.Datetime.to_string(start_of_last_week)),
-                    (field_name, "<", fields.Datetime.to_string(end_of_last_week))]
-
-        if val == "last_month":
-            start_of_last_month = current_date.replace(day=1) - relativedelta(months=1)
-            end_of_last_month = current_date.replace(day=1)
-            return ["&", (field_name, ">=", fields.Datetime.to_string(start_of_last_month)),
-                    (field_name, "<", fields.Datetime.to_string(end_of_last_month))]
-
-        if val == "last_quarter":
-            quarter_start_month = ((current_date.month - 1) // 3) * 3 + 1
-            end_of_last_quarter = current_date.replace(month=quarter_start_month, day=1)
-            start_of_last_quarter = end_of_last_quarter - relativedelta(months=3)
-            return ["&", (field_name, ">=", fields.Datetime.to_string(start_of_last_quarter)),
-                    (field_name, "<", fields.Datetime.to_string(end_of_last_quarter))]
-
-        if val == "last_year":
-            start_of_last_year = current_date.replace(year=current_date.year - 1, month=1, day=1)
-            end_of_last_year = current_date.replace(month=1, day=1)
-            return ["&", (field_name, ">=", fields.Datetime.to_string(start_of_last_year)),
-                    (field_name, "<", fields.Datetime.to_string(end_of_last_year))]
-
-        if val == "last_7_days":
-            start_of_last_7_days = current_date - timedelta(days=6)
-            return [(field_name, ">=", fields.Datetime.to_string(start_of_last_7_days))]
-
-        if val == "last_30_days":
-            start_of_last_30_days = current_date - timedelta(days=29)
-            return [(field_name, ">=", fields.Datetime.to_string(start_of_last_30_days))]
-
-        if val == "last_90_days":
-            start_of_last_90_days = current_date - timedelta(days=89)
-            return [(field_name, ">=", fields.Datetime.to_string(start_of_last_90_days))]
-
-        if val == "last_365_days":
-            start_of_last_365_days = current_date - timedelta(days=364)
-            return [(field_name, ">=", fields.Datetime.to_string(start_of_last_365_days))]
-
-        if val == "next_day":
-            start_of_next_day = current_date + timedelta(days=1)
-            end_of_next_day = start_of_next_day + timedelta(days=1)
-            return ["&", (field_name, ">=", fields.Datetime.to_string(start_of_next_day)),
-                    (field_name, "<", fields.Datetime.to_string(end_of_next_day))]
-
-        if val == "next_week":
-            start_of_next_week = current_date + timedelta(days=(7 - current_date.weekday()))
-            end_of_next_week = start_of_next_week + timedelta(days=7)
-            return ["&", (field_name, ">=", fields.Datetime.to_string(start_of_next_week)),
-                    (field_name, "<", fields.Datetime.to_string(end_of_next_week))]
-
-        if val == "next_month":
-            start_of_next_month = current_date.replace(day=1) + relativedelta(months=1)
-            end_of_next_month = start_of_next_month + relativedelta(months=1)
-            return ["&", (field_name, ">=", fields.Datetime.to_string(start_of_next_month)),
-                    (field_name, "<", fields.Datetime.to_string(end_of_next_month))]
-
-        if val == "next_quarter":
-            quarter_start_month = ((current_date.month - 1) // 3) * 3 + 1
-            end_of_current_quarter = current_date.replace(month=quarter_start_month, day=1) + relativedelta(months=3)
-            start_of_next_quarter = end_of_current_quarter
-            end_of_next_quarter = start_of_next_quarter + relativedelta(months=3)
-            return ["&", (field_name, ">=", fields.Datetime.to_string(start_of_next_quarter)),
-                    (field_name, "<", fields.Datetime.to_string(end_of_next_quarter))]
-
-        if val == "next_year":
-            start_of_next_year = current_date.replace(year=current_date.year + 1, month=1, day=1)
-            end_of_next_year = start_of_next_year + relativedelta(years=1)
-            return ["&", (field_name, ">=", fields.Datetime.to_string(start_of_next_year)),
-                    (field_name, "<", fields.Datetime.to_string(end_of_next_year))]
+        window = date_filter_windows(day or get_date_bucket()).get(val)
+        if window:
+            start, end = window
+            if not end:
+                return [(field_name, ">=", start)]
+            return ["&", (field_name, ">=", start), (field_name, "<", end)]
 
     return [tuple(domain)]
 
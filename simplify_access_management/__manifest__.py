@@ -11,7 +11,7 @@
 
 {
     'name': 'Simplify Access Management',
-    'version': '18.0.5.3.8',
+    'version': '18.0.5.4.0',
     'sequence': 5,
     'author': 'Loyalle Consulting',
     'license': 'OPL-1',
@@ -234,7 +234,10 @@
         'security/res_groups.xml',
         'security/ir.model.access.csv',
         'data/view_data.xml',
+        'data/ir_cron_data.xml',
         'views/access_management_view.xml',
+        'views/access_rights_matrix_view.xml',
+        'views/access_hook_log_view.xml',
         'views/res_users_view.xml',
         'views/store_model_nodes_view.xml',
     ],
@@ -254,7 +257,6 @@
         ],
     },
     'depends': ['base','mail','web','advanced_web_domain_widget'],
-    'post_init_hook': 'post_install_action_dup_hook',
     'application': True,
     'installable': True,
     'auto_install': False,
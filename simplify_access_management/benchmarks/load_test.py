@@ -0,0 +1,335 @@
+#!/usr/bin/env python3
+"""
+Load test of access managed web client sessions, driven against a running
+Odoo server over HTTP. Only the standard library is needed.
+
+Run the server with workers (``--workers=N``) so that the clients are
+served concurrently, and log the requests to a file (``--logfile``) to get
+the queries per request: the werkzeug lines end with the query count of the
+request, they are summed per route.
+
+Compare a database with the module installed to one without::
+
+    load_test.py seed --db with_sam --users 2000 --packs 50 --hide-fields 500
+    load_test.py seed --db without_sam --users 2000
+    load_test.py run --db with_sam --clients 32 --server-log odoo.log --output with_sam.json
+    load_test.py run --db without_sam --clients 32 --server-log odoo.log --output without_sam.json
+    load_test.py compare with_sam.json without_sam.json
+
+``seed`` is idempotent: missing users and companies are created, the packs
+it generated before are replaced. On a database without the module only
+users and companies are created.
+"""
+import argparse
+import http.cookiejar
+import itertools
+import json
+import math
+import random
+import re
+import threading
+import time
+import urllib.request
+from collections import defaultdict
+
+# models whose fields the generated hide.field lines hide
+HIDE_FIELD_MODELS = ('res.partner', 'res.users', 'res.company', 'res.country', 'ir.attachment')
+
+# werkzeug request line, ending with the query count, sql time and remaining time
+LOG_LINE_RE = re.compile(r'"(?:GET|POST) (\S+) HTTP/[\d.]+" \d{3} \S+ (\d+) ([\d.]+) ([\d.]+)')
+
+
+class Client:
+    """ A browser-like session: its own cookies, JSON-RPC helpers. """
+
+    def __init__(self, url, db):
+        self.url = url.rstrip('/')
+        self.db = db
+        self.opener = urllib.request.build_opener(urllib.request.HTTPCookieProcessor(http.cookiejar.CookieJar()))
+        self.ids = itertools.count(1)
+
+    def get(self, path):
+        with self.opener.open(self.url + path) as response:
+            return response.read()
+
+    def rpc(self, path, params):
+        payload = {'jsonrpc': '2.0', 'method': 'call', 'id': next(self.ids), 'params': params}
+        request = urllib.request.Request(
+            self.url + path, json.dumps(payload).encode(), {'Content-Type': 'application/json'})
+        with self.opener.open(request) as response:
+            reply = json.load(response)
+        if reply.get('error'):
+            error = reply['error']
+            raise RuntimeError('%s: %s' % (path, error.get('data', {}).get('message') or error.get('message')))
+        return reply['result']
+
+    def call_kw(self, model, method, args=(), **kwargs):
+        return self.rpc('/web/dataset/call_kw/%s/%s' % (model, method), {
+            'model': model, 'method': method, 'args': list(args), 'kwargs': kwargs,
+        })
+
+    def authenticate(self, login, password):
+        return self.rpc('/web/session/authenticate', {'db': self.db, 'login': login, 'password': password})
+
+
+def chunks(items, size):
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
+
+def seed(args):
+    """ Create the companies, users, packs and rule lines of the scenario. """
+    rng = random.Random(args.seed)
+    client = Client(args.url, args.db)
+    session = client.authenticate(args.admin_login, args.admin_password)
+
+    companies = client.call_kw('res.company', 'search_read', [[('name', '=like', args.prefix + '%')]], fields=['name'])
+    existing = {company['name'] for company in companies}
+    missing = ['%s company %d' % (args.prefix, index) for index in range(args.companies)]
+    missing = [name for name in missing if name not in existing]
+    if missing:
+        client.call_kw('res.company', 'create', [[{'name': name} for name in missing]])
+    company_ids = client.call_kw('res.company', 'search', [[('name', '=like', args.prefix + '%')]])
+    company_ids.append(client.call_kw('res.users', 'read', [[session['uid']]], fields=['company_id'])[0]['company_id'][0])
+
+    logins = ['%s_user_%d' % (args.prefix, index) for index in range(args.users)]
+    users = client.call_kw('res.users', 'search_read', [[('login', 'in', logins)]], fields=['login'],
+                           context={'active_test': False})
+    existing = {user['login'] for user in users}
+    vals_list = []
+    for login in logins:
+        if login in existing:
+            continue
+        user_companies = rng.sample(company_ids, rng.randint(1, min(3, len(company_ids))))
+        vals_list.append({
+            'name': login.replace('_', ' ').title(),
+            'login': login,
+            'password': args.user_password,
+            'company_id': user_companies[0],
+            'company_ids': [(6, 0, user_companies)],
+        })
+    for batch in chunks(vals_list, 100):
+        client.call_kw('res.users', 'create', [batch], context={'no_reset_password': True})
+    user_ids = client.call_kw('res.users', 'search', [[('login', 'in', logins)]])
+    print('%d companies, %d users' % (len(company_ids), len(user_ids)))
+
+    modules = client.call_kw('ir.module.module', 'search_count',
+                             [[('name', '=', 'simplify_access_management'), ('state', '=', 'installed')]])
+    if not modules:
+        print('simplify_access_management is not installed, no pack created')
+        return
+
+    old_packs = client.call_kw('access.management', 'search',
+                               [[('name', '=like', args.prefix + '%')]], context={'active_test': False})
+    if old_packs:
+        client.call_kw('access.management', 'unlink', [old_packs])
+
+    fields_by_model = {}
+    for model_name in HIDE_FIELD_MODELS:
+        fields_by_model[model_name] = client.call_kw('ir.model.fields', 'search_read', [[
+            ('model', '=', model_name), ('name', 'not in', ('id', 'display_name', 'name')), ('store', '=', True),
+        ]], fields=['model_id'])
+    hide_field_vals = [[] for _index in range(args.packs)]
+    for index in range(args.hide_fields):
+        model_name = rng.choice(HIDE_FIELD_MODELS)
+        fields = rng.sample(fields_by_model[model_name], min(3, len(fields_by_model[model_name])))
+        hide_field_vals[index % args.packs].append((0, 0, {
+            'model_id': fields[0]['model_id'][0],
+            'field_id': [(6, 0, [field['id'] for field in fields])],
+            'invisible': rng.random() < 0.5,
+            'readonly': rng.random() < 0.5,
+        }))
+    pack_vals = []
+    for index in range(args.packs):
+        without_company = rng.random() < 0.5
+        pack_vals.append({
+            'name': '%s pack %d' % (args.prefix, index),
+            'user_ids': [(6, 0, rng.sample(user_ids, min(len(user_ids), max(1, len(user_ids) * 2 // args.packs))))],
+            'is_apply_on_without_company': without_company,
+            'company_ids': [(6, 0, [] if without_company else rng.sample(company_ids, 1))],
+            'hide_field_ids': hide_field_vals[index],
+        })
+    for batch in chunks(pack_vals, 10):
+        client.call_kw('access.management', 'create', [batch])
+    print('%d packs, %d hide.field lines' % (args.packs, args.hide_fields))
+
+
+def replay_session(client, args, user_id, record_ids, timings):
+    """ Steps of a user opening the web client, the contacts and a record. """
+
+    def step(name, func):
+        start = time.perf_counter()
+        try:
+            result = func()
+        except Exception as error:  # a failing step is reported, the session goes on
+            timings['%s (error)' % name].append(time.perf_counter() - start)
+            print('%s: %s' % (name, error))
+            return None
+        timings[name].append(time.perf_counter() - start)
+        return result
+
+    step('web_client', lambda: client.get('/odoo'))
+    step('load_menus', lambda: client.get('/web/webclient/load_menus/%d' % time.time_ns()))
+    action = step('action_load', lambda: client.rpc('/web/action/load', {'action_id': args.action}))
+    model = action['res_model'] if action else 'res.partner'
+    step('get_views', lambda: client.call_kw(model, 'get_views', views=[[False, 'list'], [False, 'form'], [False, 'search']],
+                                             options={'load_filters': True, 'toolbar': True}))
+    step('search_read', lambda: client.call_kw(model, 'search_read', [[]], fields=['display_name'], limit=80))
+    if record_ids:
+        step('read', lambda: client.call_kw(model, 'read', [[random.choice(record_ids)]], fields=['display_name']))
+    step('write', lambda: client.call_kw('res.users', 'write', [[user_id], {'signature': '<p>%d</p>' % time.time_ns()}]))
+
+
+def run_client(args, logins, results, lock):
+    timings = defaultdict(list)
+    for login in logins:
+        client = Client(args.url, args.db)
+        start = time.perf_counter()
+        try:
+            session = client.authenticate(login, args.user_password)
+        except Exception as error:
+            print('%s: %s' % (login, error))
+            continue
+        timings['authenticate'].append(time.perf_counter() - start)
+        record_ids = client.call_kw('res.partner', 'search', [[]], limit=20)
+        for _index in range(args.sessions):
+            replay_session(client, args, session['uid'], record_ids, timings)
+    with lock:
+        for name, values in timings.items():
+            results[name].extend(values)
+
+
+def percentile(values, rank):
+    """ Nearest-rank percentile. """
+    values = sorted(values)
+    return values[max(0, math.ceil(rank / 100 * len(values)) - 1)]
+
+
+def read_server_log(path, offset):
+    """ Sum the query counts of the werkzeug lines written after ``offset``, per route. """
+    queries = defaultdict(list)
+    with open(path, encoding='utf-8', errors='replace') as log:
+        log.seek(offset)
+        for line in log:
+            match = LOG_LINE_RE.search(line)
+            if match:
+                route = re.sub(r'/load_menus/\S+', '/load_menus', match.group(1).split('?')[0])
+                queries[route].append(int(match.group(2)))
+    return {route: {'requests': len(counts), 'queries_avg': sum(counts) / len(counts), 'queries_max': max(counts)}
+            for route, counts in sorted(queries.items())}
+
+
+def run(args):
+    logins = ['%s_user_%d' % (args.prefix, index) for index in range(args.users)]
+    random.Random(args.seed).shuffle(logins)
+    logins = logins[:args.clients * args.logins_per_client]
+    offset = None
+    if args.server_log:
+        with open(args.server_log, 'rb') as log:
+            offset = log.seek(0, 2)
+
+    results = defaultdict(list)
+    lock = threading.Lock()
+    threads = [
+        threading.Thread(target=run_client, args=(args, logins[index::args.clients], results, lock))
+        for index in range(args.clients)
+    ]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - start
+
+    report = {
+        'db': args.db,
+        'clients': args.clients,
+        'elapsed': elapsed,
+        'steps': {
+            name: {
+                'count': len(values),
+                'p50': percentile(values, 50) * 1000,
+                'p95': percentile(values, 95) * 1000,
+                'p99': percentile(values, 99) * 1000,
+            }
+            for name, values in sorted(results.items())
+        },
+        'queries': read_server_log(args.server_log, offset) if args.server_log else {},
+    }
+    print_report(report)
+    if args.output:
+        with open(args.output, 'w') as output:
+            json.dump(report, output, indent=2)
+
+
+def print_report(report):
+    print('%s: %d clients, %.1fs' % (report['db'], report['clients'], report['elapsed']))
+    print('%-24s %8s %10s %10s %10s' % ('step', 'count', 'p50 ms', 'p95 ms', 'p99 ms'))
+    for name, stats in report['steps'].items():
+        print('%-24s %8d %10.1f %10.1f %10.1f' % (name, stats['count'], stats['p50'], stats['p95'], stats['p99']))
+    if report['queries']:
+        print('%-60s %8s %10s %10s' % ('route', 'requests', 'avg q', 'max q'))
+        for route, stats in report['queries'].items():
+            print('%-60s %8d %10.1f %10d' % (route, stats['requests'], stats['queries_avg'], stats['queries_max']))
+
+
+def compare(args):
+    with open(args.report) as file:
+        report = json.load(file)
+    with open(args.baseline) as file:
+        baseline = json.load(file)
+    print('%s against %s' % (report['db'], baseline['db']))
+    print('%-24s %12s %12s %12s' % ('step', 'p50 ms', 'p95 ms', 'p99 ms'))
+    for name, stats in report['steps'].items():
+        base = baseline['steps'].get(name)
+        cells = [
+            '%.1f (%+.1f)' % (stats[rank], stats[rank] - base[rank]) if base else '%.1f' % stats[rank]
+            for rank in ('p50', 'p95', 'p99')
+        ]
+        print('%-24s %12s %12s %12s' % (name, *cells))
+    if report['queries']:
+        print('%-60s %16s' % ('route', 'avg queries'))
+        for route, stats in report['queries'].items():
+            base = baseline['queries'].get(route)
+            delta = ' (%+.1f)' % (stats['queries_avg'] - base['queries_avg']) if base else ''
+            print('%-60s %16s' % (route, '%.1f%s' % (stats['queries_avg'], delta)))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--url', default='http://localhost:8069')
+    parser.add_argument('--db', help="database to seed or load")
+    parser.add_argument('--prefix', default='loadtest', help="prefix of the generated records")
+    parser.add_argument('--seed', type=int, default=42, help="random seed, for reproducible scenarios")
+    parser.add_argument('--users', type=int, default=2000)
+    parser.add_argument('--user-password', default='loadtest')
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    seed_parser = commands.add_parser('seed', help="generate companies, users, packs and rule lines")
+    seed_parser.add_argument('--admin-login', default='admin')
+    seed_parser.add_argument('--admin-password', default='admin')
+    seed_parser.add_argument('--companies', type=int, default=5)
+    seed_parser.add_argument('--packs', type=int, default=50)
+    seed_parser.add_argument('--hide-fields', type=int, default=500)
+    seed_parser.set_defaults(func=seed)
+
+    run_parser = commands.add_parser('run', help="replay web client sessions from concurrent clients")
+    run_parser.add_argument('--clients', type=int, default=16)
+    run_parser.add_argument('--logins-per-client', type=int, default=5)
+    run_parser.add_argument('--sessions', type=int, default=3, help="sessions replayed per login")
+    run_parser.add_argument('--action', default='base.action_partner_form')
+    run_parser.add_argument('--server-log', help="log file of the server, to count the queries per request")
+    run_parser.add_argument('--output', help="JSON file receiving the report")
+    run_parser.set_defaults(func=run)
+
+    compare_parser = commands.add_parser('compare', help="compare two reports of run")
+    compare_parser.add_argument('report')
+    compare_parser.add_argument('baseline')
+    compare_parser.set_defaults(func=compare)
+
+    args = parser.parse_args()
+    args.func(args)
+
+
+if __name__ == '__main__':
+    main()
@@ -2,3 +2,4 @@
 from . import action
 from . import export
 
+from . import metrics
@@ -0,0 +1,32 @@
+import hmac
+
+from odoo import http
+from odoo.http import request
+from ..models.query_prepare import render_metrics
+
+METRICS_TOKEN_PARAM = 'simplify_access_management.metrics_token'
+
+
+class AccessMetrics(http.Controller):
+
+    @http.route('/simplify_access_management/metrics', type='http', auth='public', methods=['GET'], readonly=True)
+    def metrics(self):
+        """ Metrics of the access engine in the worker answering, in the
+        Prometheus text format. Scrapers authenticate with the bearer token
+        stored in the ``simplify_access_management.metrics_token`` system
+        parameter, admins with their session. """
+        if not self._check_metrics_access():
+            return request.make_response('Forbidden', status=403, headers=[('Content-Type', 'text/plain')])
+        return request.make_response(render_metrics(), headers=[
+            ('Content-Type', 'text/plain; version=0.0.4; charset=utf-8'),
+            ('Cache-Control', 'no-store'),
+        ])
+
+    def _check_metrics_access(self):
+        if request.session.uid and request.env.user._is_system():
+            return True
+        authorization = request.httprequest.headers.get('Authorization', '')
+        scheme, _sep, token = authorization.partition(' ')
+        expected = request.env['ir.config_parameter'].sudo().get_param(METRICS_TOKEN_PARAM)
+        return bool(expected and token and scheme.lower() == 'bearer'
+                    and hmac.compare_digest(token.strip().encode(), expected.encode()))
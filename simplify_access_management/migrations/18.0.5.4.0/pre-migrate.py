@@ -0,0 +1,64 @@
+from odoo.tools import SQL
+
+# menu.item and action.data used to be tables mirroring ir.ui.menu and
+# ir.actions.actions, they are now views sharing their ids. The relations are
+# moved to the ids of the core records before the tables are dropped, the
+# views are created by the models.
+MIRRORS = [
+    # (mirror table, mirrored id column, core table, [(relation table, owner column, mirror column)])
+    ('menu_item', 'menu_id', 'ir_ui_menu', [
+        ('access_management_menu_rel_ah', 'access_management_id', 'menu_id'),
+    ]),
+    ('action_data', 'action_id', 'ir_actions', [
+        ('remove_action_server_action_data_rel_ah', 'remove_action_id', 'server_action_id'),
+        ('remove_action_report_action_data_rel_ah', 'remove_action_id', 'report_action_id'),
+    ]),
+]
+
+
+def _table_kind(cr, table):
+    cr.execute(SQL("SELECT relkind FROM pg_class WHERE relname = %s AND relkind IN ('r', 'v')", table))
+    row = cr.fetchone()
+    return row and row[0]
+
+
+def migrate(cr, version):
+    for mirror, mirrored_column, core, relations in MIRRORS:
+        if _table_kind(cr, mirror) != 'r':
+            continue
+        for relation, owner_column, mirror_column in relations:
+            if _table_kind(cr, relation) != 'r':
+                continue
+            # foreign keys towards the mirror would reject the core ids
+            cr.execute(SQL(
+                """SELECT conname FROM pg_constraint
+                   WHERE contype = 'f' AND conrelid = %s::regclass AND confrelid = %s::regclass""",
+                relation, mirror,
+            ))
+            for (constraint,) in cr.fetchall():
+                cr.execute(SQL("ALTER TABLE %s DROP CONSTRAINT %s",
+                               SQL.identifier(relation), SQL.identifier(constraint)))
+            cr.execute(SQL(
+                "DELETE FROM %s WHERE %s NOT IN (SELECT id FROM %s)",
+                SQL.identifier(relation), SQL.identifier(mirror_column), SQL.identifier(mirror),
+            ))
+            cr.execute(SQL(
+                """WITH moved AS (
+                       DELETE FROM %(relation)s AS rel
+                       USING %(mirror)s AS mirror
+                       WHERE mirror.id = rel.%(mirror_column)s
+                       RETURNING rel.%(owner_column)s AS owner_id, mirror.%(mirrored_column)s AS core_id
+                   )
+                   INSERT INTO %(relation)s (%(owner_column)s, %(mirror_column)s)
+                   SELECT DISTINCT moved.owner_id, moved.core_id
+                   FROM moved
+                   JOIN %(core)s AS core ON core.id = moved.core_id
+                   ON CONFLICT DO NOTHING""",
+                relation=SQL.identifier(relation),
+                mirror=SQL.identifier(mirror),
+                core=SQL.identifier(core),
+                owner_column=SQL.identifier(owner_column),
+                mirror_column=SQL.identifier(mirror_column),
+                mirrored_column=SQL.identifier(mirrored_column),
+            ))
+        cr.execute(SQL("DROP TABLE %s CASCADE", SQL.identifier(mirror)))
@@ -1,3 +1,4 @@
+from . import access_rule_mixin
 from . import action_data
 from . import view_data
 from . import remove_action
@@ -5,15 +6,19 @@ from . import ir_rule
 from . import access_management
 from . import ir_ui_menu
 from . import res_users
-from . import ir_actions_actions
 from . import hide_field
 from . import models
 from . import ir_model_access
 from . import ir_ui_view
+from . import ir_http
 from . import access_domain_ah
 from . import ir_module_module
 from . import hide_view_nodes
 from . import hide_filters_groups
+from . import store_nodes_scan_queue
 from . import ir_model
 from . import hide_chatter
-from . import menu_item
\ No newline at end of file
+from . import menu_item
+from . import access_effective_rule
+from . import access_rights_matrix
+from . import access_hook_log
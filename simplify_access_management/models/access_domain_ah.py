@@ -4,6 +4,7 @@ from odoo.exceptions import ValidationError, UserError
 
 class access_domain_ah(models.Model):
     _name = 'access.domain.ah'
+    _inherit = ['access.rule.mixin']
     _description = 'Access Domain'
 
     model_id = fields.Many2one(
@@ -0,0 +1,37 @@
+from odoo import fields, models
+from odoo.tools import SQL
+from .query_prepare import EFFECTIVE_RULE_TABLE, refresh_effective_rules
+
+
+class access_effective_rule(models.Model):
+    """ Rules applying to each user and company, denormalized from the packs
+    and their rule lines. Rows are rebuilt per user whenever the policy of the
+    user changes, see ``refresh_effective_rules``. """
+    _name = 'access.effective.rule'
+    _description = 'Access Effective Rule'
+    _table = EFFECTIVE_RULE_TABLE
+    _auto = False
+
+    user_id = fields.Many2one('res.users', 'User', readonly=True)
+    company_id = fields.Integer('Company', readonly=True, help="0 for the packs applied without company.")
+    rule_kind = fields.Char('Rule Model', readonly=True)
+    model = fields.Char('Model', readonly=True)
+
+    def init(self):
+        # the module is loaded last, once every rule table exists
+        self.env.cr.execute(SQL(
+            """CREATE TABLE IF NOT EXISTS %(table)s (
+                   id SERIAL PRIMARY KEY,
+                   user_id INTEGER NOT NULL REFERENCES res_users (id) ON DELETE CASCADE,
+                   company_id INTEGER NOT NULL,
+                   rule_kind VARCHAR NOT NULL,
+                   model VARCHAR NOT NULL,
+                   rule_ids INTEGER[] NOT NULL,
+                   flags JSONB NOT NULL,
+                   signature VARCHAR NOT NULL
+               );
+               CREATE INDEX IF NOT EXISTS %(index)s ON %(table)s (user_id, company_id)""",
+            table=SQL.identifier(self._table),
+            index=SQL.identifier(self._table + '_user_company_index'),
+        ))
+        refresh_effective_rules(self.env)
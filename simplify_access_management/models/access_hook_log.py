@@ -0,0 +1,43 @@
+from datetime import timedelta
+
+from odoo import api, fields, models
+from odoo.tools import SQL
+
+
+class access_hook_log(models.Model):
+    """ Aggregated measures of the access hooks, flushed periodically by each
+    process while the instrumentation is enabled, see ``instrument_hook``. """
+    _name = 'access.hook.log'
+    _description = 'Access Hook Log'
+    _order = 'date desc, id desc'
+    _log_access = False
+
+    date = fields.Datetime('Date', required=True, index=True, readonly=True)
+    hook = fields.Char('Hook', required=True, readonly=True)
+    model = fields.Char('Model', readonly=True)
+    user_id = fields.Many2one('res.users', 'User', ondelete='cascade', readonly=True)
+    sample_rate = fields.Float('Sample Rate', aggregator='avg', readonly=True,
+                               help="Share of the calls measured, the other calls are not counted.")
+    calls = fields.Integer('Calls', readonly=True)
+    wall_time = fields.Float('Wall Time (ms)', readonly=True)
+    sql_count = fields.Integer('Queries', readonly=True)
+    sql_time = fields.Float('Query Time (ms)', readonly=True)
+    max_wall_time = fields.Float('Max Wall Time (ms)', aggregator='max', readonly=True)
+    avg_wall_time = fields.Float('Average Wall Time (ms)', compute='_compute_averages')
+    avg_sql_count = fields.Float('Average Queries', compute='_compute_averages')
+
+    @api.depends('calls', 'wall_time', 'sql_count')
+    def _compute_averages(self):
+        for log in self:
+            log.avg_wall_time = log.wall_time / log.calls if log.calls else 0.0
+            log.avg_sql_count = log.sql_count / log.calls if log.calls else 0.0
+
+    @api.model
+    def _gc_hook_logs(self):
+        """ Delete the logs older than the retention period. """
+        days = int(self.env['ir.config_parameter'].sudo().get_param(
+            'simplify_access_management.hook_log_retention_days', 7))
+        self.env.cr.execute(SQL(
+            "DELETE FROM %s WHERE date < %s",
+            SQL.identifier(self._table), fields.Datetime.now() - timedelta(days=days),
+        ))
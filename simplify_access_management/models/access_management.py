@@ -1,7 +1,9 @@
-from odoo import fields, models, api, _
+from odoo import fields, models, api, tools, _
 from odoo.exceptions import UserError
-from odoo.http import request
-from .query_prepare import search_data
+from odoo.tools import SQL
+from .query_prepare import search_data, compile_policy, compile_access_rights, compile_view_policy, \
+    compile_chatter_policy, get_policy_snapshot, compute_access_guard, bump_policy_versions, refresh_access_guard, \
+    read_access_guard, compute_rights_matrix, count_cache_lookups, count_cache_misses, POLICY_VERSION_SEQUENCE
 
 class access_management(models.Model):
     _name = 'access.management'
@@ -72,10 +74,18 @@ class access_management(models.Model):
             record.write({'active': not record.active})
         return True
 
+    def init(self):
+        self.env.cr.execute(SQL("CREATE SEQUENCE IF NOT EXISTS %s", SQL.identifier(POLICY_VERSION_SEQUENCE)))
+
+    def _access_packs_changed(self, user_ids, guard):
+        bump_policy_versions(self.env, user_ids)
+        refresh_access_guard(self.env, guard)
+
     @api.model_create_multi
     def create(self, vals_list):
+        guard = read_access_guard(self.env)
         res = super(access_management, self).create(vals_list)
-        request.registry.clear_cache()
+        res._access_packs_changed(res.user_ids.ids, guard)
         for record in res:
             if record.readonly:
                 for user in record.user_ids:
@@ -84,20 +94,61 @@ class access_management(models.Model):
         return res
 
     def unlink(self):
+        user_ids = self.user_ids.ids
+        guard = read_access_guard(self.env)
         res = super(access_management, self).unlink()
-        request.env.registry.clear_cache()
+        self._access_packs_changed(user_ids, guard)
         return res
 
     def write(self, vals):
+        user_ids = set(self.user_ids.ids)
+        guard = read_access_guard(self.env)
         res = super(access_management, self).write(vals)
 
         if any(self.mapped('readonly')):
             for user in self.user_ids:
                 if user.has_group('base.group_system') or user.has_group('base.group_erp_manager'):
                     raise UserError(_('Admin user can not be set as a read-only..!'))
-        request.env.registry.clear_cache()
+        self._access_packs_changed(user_ids | set(self.user_ids.ids), guard)
         return res
 
+    @count_cache_lookups('policy_snapshot')
+    @api.model
+    @tools.ormcache('uid', 'company_id', 'version')
+    @count_cache_misses('policy_snapshot')
+    def _get_policy_snapshot(self, uid, company_id, version):
+        """ Compiled access policy of a user in a company. ``version`` is the
+        policy version of the user, a change of one of its packs or rules
+        gives it a new one, and so a new cache entry. """
+        return compile_policy(self.env, uid, company_id)
+
+    @count_cache_lookups('access_rights')
+    @api.model
+    @tools.ormcache('uid', 'company_id', 'version')
+    @count_cache_misses('access_rights')
+    def _get_access_rights(self, uid, company_id, version):
+        return compile_access_rights(self._get_policy_snapshot(uid, company_id, version))
+
+    @api.model
+    @tools.ormcache('model_name', 'fingerprint')
+    def _get_view_policy(self, model_name, fingerprint, snapshot):
+        """ View policy of a model, see ``compile_view_policy``. The
+        fingerprint identifies the rules of ``snapshot``, users sharing a
+        policy share the cache entry. """
+        return compile_view_policy(self.env, snapshot, model_name)
+
+    @api.model
+    @tools.ormcache()
+    def _get_access_guard(self):
+        """ Registry level flags of the access hooks, see ``compute_access_guard``. """
+        return compute_access_guard(self._cr)
+
+    @api.model
+    def _get_rights_matrix(self, user_ids=None, company_ids=None, model_names=None):
+        """ Effective read/create/write/unlink rights of the users on the
+        models in each of their companies, see ``compute_rights_matrix``. """
+        return compute_rights_matrix(self.env, user_ids, company_ids, model_names)
+
     def get_remove_options(self, model):
         restrict_export = search_data(self, self._name, model, ('hide_export','=',True), 'AND')
         remove_action = search_data(self, 'remove.action', model)
@@ -121,44 +172,11 @@ class access_management(models.Model):
 
     @api.model
     def get_chatter_hide_details(self, user_id, company_id, model=False):
-        hide_send_mail = hide_log_notes = hide_schedule_activity = False
-        chatter_access_id = search_data(self, self._name, condition=('hide_chatter','=',True), operator='AND', limit=1)
-        if chatter_access_id:
-            return {'hide_send_mail': True, 'hide_log_notes': True, 'hide_schedule_activity': True}
-        else:
-            hide_send_mail_id = search_data(self, self._name, condition=('hide_send_mail','=',True), operator='AND',limit=1)
-            if hide_send_mail_id:
-                hide_send_mail = True
-            hide_log_notes_id = search_data(self, self._name, condition=('hide_log_notes','=',True), operator='AND',limit=1)
-            if hide_log_notes_id:
-                hide_log_notes = True
-            hide_schedule_activity_id = search_data(self, self._name, condition=('hide_schedule_activity','=',True), operator='AND',limit=1)
-            if hide_schedule_activity_id:
-                hide_schedule_activity = True
+        """ Chatter buttons to hide on ``model``. The web client gets the
+        flags of every model with the session info, see ``ir.http``. """
+        chatter_policy = compile_chatter_policy(get_policy_snapshot(self.env, company_id))
+        return dict(chatter_policy['models'].get(model) or chatter_policy['default'])
 
-        if model:
-            hide_ids = search_data(self, 'hide.chatter', model, condition=('hide_chatter','=',True), operator='AND', limit=1)
-            if hide_ids:
-                return {'hide_send_mail': True, 'hide_log_notes': True, 'hide_schedule_activity': True}
-            else:
-                if not hide_send_mail:
-                    hide_send_mail_id = search_data(self, 'hide.chatter', model, condition=('hide_send_mail','=',True), operator='AND',limit=1)
-                    if hide_send_mail_id:
-                        hide_send_mail = True
-                if not hide_log_notes:
-                    hide_log_notes_id = search_data(self, 'hide.chatter', model, condition=('hide_log_notes','=',True), operator='AND',limit=1)
-                    if hide_log_notes_id:
-                        hide_log_notes = True
-                if not hide_schedule_activity:
-                    hide_schedule_activity_id = search_data(self, 'hide.chatter', model, condition=('hide_schedule_activity','=',True), operator='AND',limit=1)
-                    if hide_schedule_activity_id:
-                        hide_schedule_activity = True
-        return {
-            'hide_send_mail': hide_send_mail,
-            'hide_log_notes': hide_log_notes,
-            'hide_schedule_activity': hide_schedule_activity
-        }
-   
     def is_spread_sheet_available(self, action_model, action_id):
         if action_model and action_id:
             model = self.env[action_model].sudo().browse(action_id).res_model
@@ -0,0 +1,73 @@
+import base64
+import csv
+import io
+
+from odoo import fields, models, _
+from odoo.exceptions import UserError
+from odoo.tools.misc import xlsxwriter
+from .query_prepare import ACCESS_RIGHT_BITS, iter_rights_matrix
+
+# rows of an xlsx sheet, header included
+XLSX_MAX_ROWS = 1048576
+
+
+class access_rights_matrix(models.TransientModel):
+    """ Export of the effective rights of the users on the models, for every
+    company they belong to. """
+    _name = 'access.rights.matrix'
+    _description = 'Access Rights Matrix'
+
+    user_ids = fields.Many2many('res.users', string='Users', help="All the active users when empty.")
+    company_ids = fields.Many2many('res.company', string='Companies', help="All the companies when empty.")
+    model_ids = fields.Many2many('ir.model', string='Models', help="All the models when empty.")
+    file_format = fields.Selection([('csv', 'CSV'), ('xlsx', 'XLSX')], string='Format', default='xlsx', required=True)
+    data = fields.Binary('File', readonly=True, attachment=False)
+    filename = fields.Char('File Name', readonly=True)
+
+    def _get_matrix_rows(self):
+        matrix = self.env['access.management']._get_rights_matrix(
+            self.user_ids.ids, self.company_ids.ids, self.model_ids.mapped('model'))
+        users = {user.id: user for user in self.env['res.users'].with_context(active_test=False).browse(matrix['users'])}
+        companies = {company.id: company.name for company in self.env['res.company'].browse(matrix['company_ids'])}
+        header = [_('User'), _('Login'), _('Company'), _('Model'), _('Model Name')]
+        header += [_('Read'), _('Create'), _('Write'), _('Delete')]
+        yield header
+        for user_id, company_id, model_name, mask in iter_rights_matrix(matrix):
+            user = users[user_id]
+            yield [user.name, user.login, companies[company_id], model_name, self.env[model_name]._description] \
+                + [bool(mask & bit) for bit in ACCESS_RIGHT_BITS.values()]
+
+    def _export_csv(self, rows):
+        output = io.StringIO()
+        writer = csv.writer(output)
+        for row in rows:
+            writer.writerow([int(value) if isinstance(value, bool) else value for value in row])
+        return output.getvalue().encode('utf-8')
+
+    def _export_xlsx(self, rows):
+        output = io.BytesIO()
+        workbook = xlsxwriter.Workbook(output, {'in_memory': True})
+        sheet = workbook.add_worksheet(_('Access Rights'))
+        header_style = workbook.add_format({'bold': True})
+        for row_index, row in enumerate(rows):
+            if row_index >= XLSX_MAX_ROWS:
+                workbook.close()
+                raise UserError(_('There are too many rights for an XLSX sheet, export them as CSV or select fewer users or models.'))
+            sheet.write_row(row_index, 0, row, header_style if not row_index else None)
+        sheet.freeze_panes(1, 0)
+        workbook.close()
+        return output.getvalue()
+
+    def action_export(self):
+        self.ensure_one()
+        rows = self._get_matrix_rows()
+        content = self._export_xlsx(rows) if self.file_format == 'xlsx' else self._export_csv(rows)
+        self.write({
+            'data': base64.b64encode(content),
+            'filename': 'access_rights_matrix.%s' % self.file_format,
+        })
+        return {
+            'type': 'ir.actions.act_url',
+            'url': '/web/content/%s/%s/data/%s?download=true' % (self._name, self.id, self.filename),
+            'target': 'self',
+        }
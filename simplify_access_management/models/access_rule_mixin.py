@@ -0,0 +1,37 @@
+from odoo import api, models
+from .query_prepare import bump_policy_versions, read_access_guard, refresh_access_guard
+
+
+class access_rule_mixin(models.AbstractModel):
+    """ Rule lines of an access pack: saving them gives the users of the
+    packs a new policy version. """
+    _name = 'access.rule.mixin'
+    _description = 'Access Rule Mixin'
+
+    def _get_access_rule_user_ids(self):
+        return set(self.sudo().access_management_id.user_ids.ids)
+
+    def _access_rules_changed(self, user_ids, guard):
+        bump_policy_versions(self.env, user_ids)
+        refresh_access_guard(self.env, guard)
+
+    @api.model_create_multi
+    def create(self, vals_list):
+        guard = read_access_guard(self.env)
+        res = super(access_rule_mixin, self).create(vals_list)
+        res._access_rules_changed(res._get_access_rule_user_ids(), guard)
+        return res
+
+    def write(self, vals):
+        user_ids = self._get_access_rule_user_ids()
+        guard = read_access_guard(self.env)
+        res = super(access_rule_mixin, self).write(vals)
+        self._access_rules_changed(user_ids | self._get_access_rule_user_ids(), guard)
+        return res
+
+    def unlink(self):
+        user_ids = self._get_access_rule_user_ids()
+        guard = read_access_guard(self.env)
+        res = super(access_rule_mixin, self).unlink()
+        self._access_rules_changed(user_ids, guard)
+        return res
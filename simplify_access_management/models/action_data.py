@@ -1,9 +1,22 @@
-from odoo import fields, models, api, _
+from odoo import api, fields, models, tools
+from odoo.tools import SQL
 
 
 class action_data(models.Model):
+    """ Actions offered to the access packs, read straight from ir.actions.actions. """
     _name = 'action.data'
     _description = "Action Data"
+    _auto = False
 
-    name = fields.Char('Name')
-    action_id = fields.Many2one('ir.actions.actions', 'Action')
+    name = fields.Char('Name', translate=True, readonly=True)
+    action_id = fields.Many2one('ir.actions.actions', 'Action', readonly=True)
+
+    def init(self):
+        tools.drop_view_if_exists(self.env.cr, self._table)
+        self.env.cr.execute(SQL(
+            """CREATE OR REPLACE VIEW %s AS (
+                   SELECT action.id, action.name, action.id AS action_id
+                   FROM ir_actions AS action
+               )""",
+            SQL.identifier(self._table),
+        ))
@@ -5,6 +5,7 @@ import ast
 
 class hide_filters_groups(models.Model):
     _name = 'hide.filters.groups'
+    _inherit = ['access.rule.mixin']
     _description = 'Hide Filters Groups'
 
     model_id = fields.Many2one('ir.model', string='Model', index=True, required=True, ondelete='cascade')
@@ -26,74 +27,11 @@ class hide_filters_groups(models.Model):
     @api.model
     @api.onchange('model_id')
     def _get_filter_groups(self):
+        # catalogued models are kept up to date by the scan queue
         store_filters_groups_obj = self.env['store.filters.groups'].sudo()
-        view_obj = self.env['ir.ui.view'].sudo()
-
-        if self.model_id and self.model_name:
-
-            view_list = ['search']
-            for view in view_list:
-                for views in view_obj.search([('model', '=', self.model_name), ('type', '=', view)]):  #
-                    # res = self.env[self.model_name].sudo().fields_view_get(view_id=views.id, view_type=view)
-                    arch, view = self.env[self.model_name].sudo()._get_view(view_id=views.id, view_type=view)
-                    # doc = etree.XML(res['arch'])
-                    doc = arch
-                    object_groups = doc.xpath("//group")
-                    for obj_group in object_groups:
-                        for group in obj_group:
-
-                            ## Group By records
-                            if group.get('name', False) and group.get('string', False) and group.get('context', False):
-                                domain = [('attribute_name', '=', group.get('name')),
-                                          ('model_id', '=', self.model_id.id), ('node_option', '=', 'group')]
-                                if not store_filters_groups_obj.search(domain):
-                                    store_filters_groups_obj.create({
-                                        'model_id': self.model_id.id,
-                                        'node_option': 'group',
-                                        'attribute_name': group.get('name'),
-                                        'attribute_string': group.get('string')
-                                    })
-
-                    object_filters = doc.xpath("//filter")
-                    for filter in object_filters:
-
-                        ## Filters By records
-                        if filter.get('name', False) or filter.get('string', False) and \
-                            (not (filter.get('invisible', False) == '1' or filter.get('invisible',False) == 1)):
-
-                            filter_string = filter.get('string', False)
-                            if filter.get('context', False) and 'group_by' in filter.get('context', False):
-                                domain = [('attribute_name', '=', filter.get('name')),
-                                        ('model_id', '=', self.model_id.id), ('node_option', '=', 'group')]
-                                
-                                
-                                if not filter_string:
-                                    filter_string = self.env[self.model_id.model].sudo()._fields[ast.literal_eval(filter.get('context')).get('group_by')].string
-                                if filter_string and not store_filters_groups_obj.search(domain):
-                                    store_filters_groups_obj.create({
-                                        'model_id': self.model_id.id,
-                                        'node_option': 'group',
-                                        'attribute_name': filter.get('name'),
-                                        'attribute_string': filter_string
-                                    })
-                            else:
-                                domain = [('attribute_name', '=', filter.get('name')),
-                                        ('model_id', '=', self.model_id.id), ('node_option', '=', 'filter')]
-
-                                if not filter.get('string', False):
-                                    if 'date' in filter.attrib:
-                                        filter_string = self.env[self.model_id.model].sudo()._fields[filter.attrib.get('date')].string
-                                    pass
-                                if not filter_string and 'help' in filter.attrib:
-                                    filter_string = filter.attrib.get('help', False)
-                                if filter_string and not store_filters_groups_obj.search(domain):
-                                    
-                                    store_filters_groups_obj.create({
-                                        'model_id': self.model_id.id,
-                                        'node_option': 'filter',
-                                        'attribute_name': filter.get('name'),
-                                        'attribute_string': filter_string
-                                    })
+        if self.model_id and self.model_name and not store_filters_groups_obj.search_count(
+                [('model_id', '=', self.model_id.id)], limit=1):
+            store_filters_groups_obj._scan_model_views(self.model_id)
 
 
 class store_model_nodes(models.Model):
@@ -106,6 +44,64 @@ class store_model_nodes(models.Model):
     attribute_name = fields.Char('Attribute Name')
     attribute_string = fields.Char('Attribute String', required=True)
 
+    @api.model
+    def _scan_model_views(self, model):
+        """
+        Catalogue the filters and group by options of the search views of
+        ``model``. Each primary view is combined and parsed once, the known
+        nodes are loaded up front and the missing ones are created in a single
+        batch.
+
+        :param model: ``ir.model`` record
+        :return: the created nodes
+        """
+        known = {
+            (node.node_option, node.attribute_name)
+            for node in self.search_fetch([('model_id', '=', model.id)], ['node_option', 'attribute_name'])
+        }
+        to_create = []
+        model_fields = self.env[model.model].sudo()._fields
+
+        def add_node(node_option, name, string):
+            if string and (node_option, name) not in known:
+                known.add((node_option, name))
+                to_create.append({
+                    'model_id': model.id,
+                    'node_option': node_option,
+                    'attribute_name': name,
+                    'attribute_string': string,
+                })
+
+        views = self.env['ir.ui.view'].sudo().search([
+            ('model', '=', model.model), ('type', '=', 'search'), ('mode', '=', 'primary'),
+        ])
+        for view in views:
+            arch, _view = self.env[model.model].sudo()._get_view(view_id=view.id, view_type='search')
+
+            ## Group By records
+            for obj_group in arch.xpath("//group"):
+                for group in obj_group:
+                    if group.get('name', False) and group.get('string', False) and group.get('context', False):
+                        add_node('group', group.get('name'), group.get('string'))
+
+            ## Filters By records
+            for filter in arch.xpath("//filter"):
+                if filter.get('name', False) or filter.get('string', False) and \
+                        (not (filter.get('invisible', False) == '1' or filter.get('invisible', False) == 1)):
+                    filter_string = filter.get('string', False)
+                    if filter.get('context', False) and 'group_by' in filter.get('context', False):
+                        if not filter_string:
+                            filter_string = model_fields[ast.literal_eval(filter.get('context')).get('group_by')].string
+                        add_node('group', filter.get('name'), filter_string)
+                    else:
+                        if not filter_string and 'date' in filter.attrib:
+                            filter_string = model_fields[filter.attrib.get('date')].string
+                        if not filter_string and 'help' in filter.attrib:
+                            filter_string = filter.attrib.get('help', False)
+                        add_node('filter', filter.get('name'), filter_string)
+
+        return self.create(to_create)
+
     def name_get(self):
         result = []
         for rec in self:
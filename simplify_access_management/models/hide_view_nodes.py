@@ -1,10 +1,13 @@
 from odoo import fields, models, api, _
+from odoo.tools import SQL
 from odoo.tools.translate import TranslationModuleReader
 from lxml import etree
+from .query_prepare import bump_policy_versions
 
 
 class hide_view_nodes(models.Model):
     _name = 'hide.view.nodes'
+    _inherit = ['access.rule.mixin']
     _description = 'Hide View Nodes'
 
     model_id = fields.Many2one(
@@ -27,186 +30,43 @@ class hide_view_nodes(models.Model):
 
     access_management_id = fields.Many2one('access.management', 'Access Management')
 
-    def _store_btn_data(self, btn, smart_button=False, smart_button_string=False):
-        # string_value is used in case of kanban view button store, 
-        string_value = 'string_value' in self._context.keys() and self._context['string_value'] or False
-
-        store_model_button_obj = self.env['store.model.nodes'].sudo()
-        name = btn.get('string') or string_value
-        if smart_button:
-            name = smart_button_string
-        store_model_button_obj.create({
-            'model_id': self.model_id.id,
-            'node_option': 'button',
-            'attribute_name': btn.get('name'),
-            'attribute_string': name,
-            'button_type': btn.get('type'),
-            'is_smart_button': smart_button,
-            'lang_code': self.env.lang,
-        })
-
-    def _get_smart_btn_string(self, btn_list, type=False):
-        store_model_button_obj = self.env['store.model.nodes'].sudo()
+    def _refresh_page_labels(self, langs=None):
+        """ Refresh the label index of the pages of the rules in ``langs``, all
+        the installed languages by default. The rules whose labels changed get
+        a new signature, so that only their cached node indexes are replaced. """
+        changed_pages = self.page_store_model_nodes_ids._refresh_label_index(langs)
+        rules = self.filtered(lambda rule: rule.page_store_model_nodes_ids & changed_pages)
+        if not rules:
+            return
+        # the signature of the effective rules is made of the write dates, the
+        # clock is read so that a rule written in this transaction changes too
+        self.env.cr.execute(SQL(
+            "UPDATE %s SET write_date = clock_timestamp() at time zone 'UTC' WHERE id IN %s",
+            SQL.identifier(self._table), tuple(rules.ids),
+        ))
+        rules.invalidate_recordset(['write_date'])
+        bump_policy_versions(self.env, rules._get_access_rule_user_ids())
 
-        def _get_span_text(span_list):
-            name = ''
-            for sp in span_list:
-                if sp.text:
-                    name = name + ' ' + sp.text
-            name = name.strip()
-            return name
-
-        for btn in btn_list:
-            name = ''
-            field_list = btn.findall('field')
-            if field_list:
-                name = field_list[0].get('string')
-            else:
-                span_list = btn.findall('span')
-                if span_list:
-                    name = _get_span_text(span_list)
-                else:
-                    div_list = btn.findall('div')
-                    if div_list:
-                        span_list = div_list[0].findall('span')
-                        if span_list:
-                            name = _get_span_text(span_list)
-            if not name:
-                try:
-                    name = btn.get('string')
-                except:
-                    pass
-            if name and (type == 'object' or type == 'action'):
-                domain = [('button_type', '=', btn.get('type')), ('attribute_string', '=', name),
-                          ('model_id', '=', self.model_id.id), ('node_option', '=', 'button')]
-                if type == 'object':
-                    domain += [('attribute_name', '=', btn.get('name'))]
-                if type == 'action':
-                    domain += [('attribute_name', '=', btn.get('name'))]
-                smart_button_id = store_model_button_obj.search(domain)
-                if not smart_button_id:
-                    self._store_btn_data(btn, smart_button=True, smart_button_string=name)
-                else:
-                    smart_button_id[0].is_smart_button = True
+    @api.model_create_multi
+    def create(self, vals_list):
+        res = super(hide_view_nodes, self).create(vals_list)
+        res.page_store_model_nodes_ids._refresh_label_index()
+        return res
+
+    def write(self, vals):
+        res = super(hide_view_nodes, self).write(vals)
+        if 'page_store_model_nodes_ids' in vals:
+            self.page_store_model_nodes_ids._refresh_label_index()
+        return res
 
     @api.model
     @api.onchange('model_id')
     def _get_button(self):
+        # catalogued models are kept up to date by the scan queue
         store_model_nodes_obj = self.env['store.model.nodes'].sudo()
-        view_obj = self.env['ir.ui.view'].sudo()
-
-        if self.model_id and self.model_name:
-
-            view_list = ['form', 'list', 'kanban']
-            for view in view_list:
-                for views in view_obj.search([('model', '=', self.model_name), ('type', '=', view)]):
-                    res = self.env[self.model_name].sudo().get_view(view_id=views.id, view_type=view)
-                    # res = self.env[self.model_name].sudo().fields_view_get(view_id=views.id,view_type=view)
-                    doc = etree.XML(res['arch'])
-
-                    object_link = doc.xpath("//a")
-                    for btn in object_link:
-                        if btn.text and '\n' not in btn.text and 'type' in btn.attrib.keys() and btn.attrib[
-                            'type'] and 'name' in btn.attrib.keys() and btn.attrib['name']:
-                            domain = [('button_type', '=', btn.get('type')), ('attribute_string', '=', btn.text),
-                                      ('attribute_name', '=', btn.get('name')), ('model_id', '=', self.model_id.id),
-                                      ('node_option', '=', 'link')]
-                            if not store_model_nodes_obj.search(domain):
-                                store_model_nodes_obj.create({
-                                    'model_id': self.model_id.id,
-                                    'node_option': 'link',
-                                    'attribute_name': btn.get('name'),
-                                    'attribute_string': btn.text,
-                                    'button_type': btn.get('type'),
-                                    'lang_code': self.env.lang,
-                                })
-
-                    object_button = doc.xpath("//button[@type='object']")
-                    for btn in object_button:
-                        string_value = btn.get('string')
-                        if view == 'kanban' and not string_value:
-                            try:
-                                string_value = btn.text if not btn.text.startswith('\n') else False
-                            except:
-                                pass
-
-                        if not string_value:
-                            fields = btn.findall(".//*[@class='o_stat_text']")
-                            if fields:
-                                string_value = ""
-                            for f in fields:
-                                if f.text:
-                                    string_value += " " + f.text
-
-                        if btn.get('name') and string_value:
-                            domain = [('button_type', '=', btn.get('type')), ('attribute_string', '=', string_value),
-                                      ('attribute_name', '=', btn.get('name')), ('model_id', '=', self.model_id.id),
-                                      ('node_option', '=', 'button')]
-                            if not store_model_nodes_obj.search(domain):
-                                self.with_context(string_value=string_value)._store_btn_data(btn)
-
-                    action_button = doc.xpath("//button[@type='action']")
-                    for btn in action_button:
-                        string_value = btn.get('string')
-                        if view == 'kanban' and not string_value:
-                            try:
-                                string_value = btn.text if not btn.text.startswith('\n') else False
-                            except:
-                                pass
-                        if btn.get('name') and string_value:
-                            domain = [('button_type', '=', btn.get('type')), ('attribute_string', '=', string_value),
-                                      ('attribute_name', '=', btn.get('name')), ('model_id', '=', self.model_id.id),
-                                      ('node_option', '=', 'button')]
-                            if not store_model_nodes_obj.search(domain):
-                                self.with_context(string_value=string_value)._store_btn_data(btn)
-
-                    if view == 'form':
-                        ## Smart Buttons Extraction
-                        smt_button_division = doc.xpath("//div[@class='oe_button_box']")
-                        if smt_button_division:
-                            smt_button_division = etree.tostring(smt_button_division[0])
-                            smt_button_division = etree.XML(smt_button_division)
-
-                            smt_object_button = smt_button_division.xpath("//button[@type='object']")
-                            self._get_smart_btn_string(smt_object_button, type='object')
-
-                            smt_action_button = smt_button_division.xpath("//button[@type='action']")
-                            self._get_smart_btn_string(smt_action_button, type='action')
-
-                        ## Tab Extraction
-                        page_list = doc.xpath("//page")
-                        if page_list:
-                            for page in page_list:
-                                if page.get('string'):
-                                    domain = [('attribute_string', '=', page.get('string')),
-                                              ('model_id', '=', self.model_id.id), ('node_option', '=', 'page')]
-                                    if page.get('name'):
-                                        domain += [('attribute_name', '=', page.get('name'))]
-                                    store_model_nodes_id = store_model_nodes_obj.search(domain, limit=1)
-                                    if not store_model_nodes_id:
-                                        store_model_nodes_obj.create({
-                                            'model_id': self.model_id.id,
-                                            'attribute_name': page.get('name'),
-                                            'attribute_string': page.get('string'),
-                                            'node_option': 'page',
-                                            'lang_code': self.env.lang,
-                                        })
-                        if self.model_name == 'res.config.settings':
-                            for setting_page in doc.xpath("//app"):
-                                if setting_page.get('string'):
-                                    domain = [('attribute_string', '=', setting_page.get('string')),
-                                              ('model_id', '=', self.model_id.id), ('node_option', '=', 'page')]
-                                    if setting_page.get('name'):
-                                        domain += [('attribute_name', '=', setting_page.get('name'))]
-                                    store_model_nodes_id = store_model_nodes_obj.search(domain, limit=1)
-                                    if not store_model_nodes_id:
-                                        store_model_nodes_obj.create({
-                                            'model_id': self.model_id.id,
-                                            'attribute_name': setting_page.get('name') or '',
-                                            'attribute_string': setting_page.get('string'),
-                                            'node_option': 'page',
-                                            'lang_code': self.env.lang,
-                                        })
+        if self.model_id and self.model_name and not store_model_nodes_obj.search_count(
+                [('model_id', '=', self.model_id.id)], limit=1):
+            store_model_nodes_obj._scan_model_views(self.model_id)
 
 
 class store_model_nodes(models.Model):
@@ -222,6 +82,187 @@ class store_model_nodes(models.Model):
     lang_code = fields.Char("Language Code")
     button_type = fields.Selection([('object', 'Object'), ('action', 'Action')], string="Button Type")
     is_smart_button = fields.Boolean('Smart Button')
+    label_index = fields.Json('Label Index', readonly=True, copy=False,
+                              help="String of the page in every installed language, used to hide it while rendering.")
+
+    @api.model
+    def _get_smart_btn_string(self, btn):
+        def _get_span_text(span_list):
+            return ' '.join(sp.text for sp in span_list if sp.text).strip()
+
+        name = None
+        field_list = btn.findall('field')
+        span_list = btn.findall('span')
+        div_list = btn.findall('div')
+        if field_list:
+            name = field_list[0].get('string')
+        elif span_list:
+            name = _get_span_text(span_list)
+        elif div_list:
+            name = _get_span_text(div_list[0].findall('span'))
+        return name or btn.get('string')
+
+    @api.model
+    def _scan_model_views(self, model):
+        """
+        Catalogue the links, buttons, smart buttons and pages of the form,
+        list and kanban views of ``model``. Each primary view is combined and
+        parsed once, the known nodes are loaded up front and the missing ones
+        are created in a single batch.
+
+        :param model: ``ir.model`` record
+        :return: the created nodes
+        """
+        known = set()
+        known_pages = set()
+        smart_candidates = {}
+        for node in self.search_fetch([('model_id', '=', model.id)],
+                                      ['node_option', 'attribute_name', 'attribute_string', 'button_type',
+                                       'is_smart_button']):
+            if node.node_option == 'page':
+                known_pages.add((node.attribute_string, node.attribute_name))
+                known_pages.add((node.attribute_string, None))
+            else:
+                key = (node.node_option, node.button_type, node.attribute_name, node.attribute_string)
+                known.add(key)
+                if node.node_option == 'button':
+                    smart_candidates.setdefault(key, node)
+
+        to_create = {}
+        smart_button_ids = set()
+
+        def add_node(key, vals):
+            if key not in known:
+                known.add(key)
+                to_create[key] = dict(vals, model_id=model.id, lang_code=self.env.lang)
+
+        def add_page(string, name):
+            if (string, name or None) in known_pages:
+                return
+            known_pages.add((string, name or None))
+            known_pages.add((string, None))
+            to_create[('page', string, name)] = {
+                'model_id': model.id,
+                'node_option': 'page',
+                'attribute_name': name,
+                'attribute_string': string,
+                'lang_code': self.env.lang,
+            }
+
+        views = self.env['ir.ui.view'].sudo().search([
+            ('model', '=', model.model), ('type', 'in', ['form', 'list', 'kanban']), ('mode', '=', 'primary'),
+        ])
+        for view in views:
+            res = self.env[model.model].sudo().get_view(view_id=view.id, view_type=view.type)
+            doc = etree.XML(res['arch'])
+
+            for btn in doc.xpath("//a"):
+                if btn.text and '\n' not in btn.text and btn.get('type') and btn.get('name'):
+                    add_node(('link', btn.get('type'), btn.get('name'), btn.text), {
+                        'node_option': 'link',
+                        'attribute_name': btn.get('name'),
+                        'attribute_string': btn.text,
+                        'button_type': btn.get('type'),
+                    })
+
+            for btn in doc.xpath("//button[@type='object' or @type='action']"):
+                string_value = btn.get('string')
+                if view.type == 'kanban' and not string_value:
+                    string_value = btn.text if btn.text and not btn.text.startswith('\n') else False
+                if not string_value and btn.get('type') == 'object':
+                    fields = btn.findall(".//*[@class='o_stat_text']")
+                    if fields:
+                        string_value = "".join(" " + f.text for f in fields if f.text)
+                if btn.get('name') and string_value:
+                    add_node(('button', btn.get('type'), btn.get('name'), string_value), {
+                        'node_option': 'button',
+                        'attribute_name': btn.get('name'),
+                        'attribute_string': string_value,
+                        'button_type': btn.get('type'),
+                    })
+
+            if view.type != 'form':
+                continue
+
+            ## Smart Buttons Extraction
+            button_box = doc.xpath("//div[@class='oe_button_box']")
+            if button_box:
+                for btn in button_box[0].xpath(".//button[@type='object' or @type='action']"):
+                    name = self._get_smart_btn_string(btn)
+                    if not name:
+                        continue
+                    key = ('button', btn.get('type'), btn.get('name'), name)
+                    if key in to_create:
+                        to_create[key]['is_smart_button'] = True
+                    elif key in smart_candidates:
+                        smart_button_ids.add(smart_candidates[key].id)
+                    else:
+                        add_node(key, {
+                            'node_option': 'button',
+                            'attribute_name': btn.get('name'),
+                            'attribute_string': name,
+                            'button_type': btn.get('type'),
+                            'is_smart_button': True,
+                        })
+
+            ## Tab Extraction
+            for page in doc.xpath("//page"):
+                if page.get('string'):
+                    add_page(page.get('string'), page.get('name'))
+            if model.model == 'res.config.settings':
+                for setting_page in doc.xpath("//app"):
+                    if setting_page.get('string'):
+                        add_page(setting_page.get('string'), setting_page.get('name') or '')
+
+        if smart_button_ids:
+            self.browse(smart_button_ids).filtered(lambda node: not node.is_smart_button).write({'is_smart_button': True})
+        return self.create(list(to_create.values()))
+
+    def _refresh_label_index(self, langs=None):
+        """ Store the string of the pages in ``langs``, every installed language
+        by default. Strings stored in another language than the one rendered
+        are translated with the terms of the form views of their model, as the
+        page is matched on the string shown in the view.
+
+        :return: the pages whose label index changed
+        """
+        installed_langs = [code for code, _name in self.env['res.lang'].get_installed()]
+        langs = [lang for lang in langs if lang in installed_langs] if langs else installed_langs
+        changed = self.browse()
+        arch_field = self.env['ir.ui.view']._fields['arch_db']
+        view_obj = self.env['ir.ui.view'].sudo()
+        pages = self.sudo().filtered(lambda node: node.node_option == 'page')
+        groups = {}
+        for page in pages:
+            groups.setdefault((page.model_id.model, page.lang_code), []).append(page)
+
+        for (model_name, lang_code), group_pages in groups.items():
+            terms = {}
+            if lang_code:
+                for view in view_obj.search([('model', '=', model_name), ('type', '=', 'form')]):
+                    translations = arch_field.get_translation_dictionary(
+                        view.with_context(lang=lang_code).arch_db,
+                        {lang: view.with_context(lang=lang).arch_db for lang in langs if lang != lang_code})
+                    for term, term_translations in translations.items():
+                        terms.setdefault(term, term_translations)
+
+            for page in group_pages:
+                source = page.with_context(lang=lang_code).attribute_string if lang_code else page.attribute_string
+                # the labels of the other languages are kept on a partial refresh
+                label_index = {lang: label for lang, label in (page.label_index or {}).items()
+                               if lang in installed_langs and lang not in langs}
+                for lang in langs:
+                    if lang == lang_code:
+                        label_index[lang] = source
+                    elif source in terms:
+                        # an untranslated term is matched on the page name
+                        label_index[lang] = terms[source].get(lang) or ''
+                    else:
+                        label_index[lang] = page.with_context(lang=lang).attribute_string
+                if label_index != page.label_index:
+                    page.label_index = label_index
+                    changed |= page
+        return changed
 
     def name_get(self):
         result = []
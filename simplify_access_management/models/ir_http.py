@@ -0,0 +1,15 @@
+from odoo import models
+from .query_prepare import compile_chatter_policy, get_access_guard, get_policy_snapshot, get_request_company_id
+
+
+class ir_http(models.AbstractModel):
+    _inherit = 'ir.http'
+
+    def session_info(self):
+        result = super(ir_http, self).session_info()
+        # read by the chatter patch, so that it renders without a round trip
+        result['access_chatter_policy'] = {'default': {}, 'models': {}}
+        if self.env.uid and get_access_guard(self.env)['enforced'] and not self.env.user._is_public():
+            snapshot = get_policy_snapshot(self.env, get_request_company_id(self.env))
+            result['access_chatter_policy'] = compile_chatter_policy(snapshot)
+        return result
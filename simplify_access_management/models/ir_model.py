@@ -1,6 +1,7 @@
 # -*- coding: utf-8 -*-
 
 from odoo import api, fields, models, tools, _
+from odoo.tools import SQL
 
 
 class ir_model(models.Model):
@@ -8,6 +9,23 @@ class ir_model(models.Model):
 
     abstract = fields.Boolean('Abstract', readonly=True)
 
+    @api.model
+    def _refresh_abstract_flags(self):
+        """ Set ``abstract`` from the registry, with a single query updating
+        only the models whose flag changed. Models missing from the registry
+        are left untouched. """
+        registry = self.env.registry
+        model_names = list(registry.models)
+        self.flush_model(['abstract'])
+        self.env.cr.execute(SQL(
+            """UPDATE ir_model AS im SET abstract = flags.abstract
+               FROM unnest(%s::varchar[], %s::bool[]) AS flags(model, abstract)
+               WHERE im.model = flags.model AND im.abstract IS DISTINCT FROM flags.abstract""",
+            model_names, [registry[model_name]._abstract for model_name in model_names],
+        ))
+        if self.env.cr.rowcount:
+            self.invalidate_model(['abstract'])
+
     # def name_get(self):
     #     res = super().name_get()
     #     if self._context.get('is_access_rights'):
@@ -65,9 +83,6 @@ class ir_module_module(models.Model):
     def _button_immediate_function(self, function):
         res = super(ir_module_module, self)._button_immediate_function(function)
         if function.__name__ in ['button_install', 'button_upgrade']:
-            for record in self.env['ir.model'].sudo().search([]):
-                try:
-                    record.abstract = self.env[record.model]._abstract
-                except:
-                    return res
+            # the views loaded by the operation are queued by ir.ui.view
+            self.env['ir.model']._refresh_abstract_flags()
         return res
@@ -18,3 +18,16 @@ class ir_module_module(models.Model):
 
         return res
 
+
+    def _update_translations(self, filter_lang=None, overwrite=False):
+        res = super(ir_module_module, self)._update_translations(filter_lang=filter_lang, overwrite=overwrite)
+        if 'store.model.nodes' in self.env:
+            # the page labels are matched on the translated view terms of the
+            # updated modules, the rules of the other models are left as is
+            view_ids = self.env['ir.model.data'].sudo().search([
+                ('module', 'in', self.mapped('name')), ('model', '=', 'ir.ui.view'),
+            ]).mapped('res_id')
+            model_names = self.env['ir.ui.view'].sudo().search([('id', 'in', view_ids)]).mapped('model')
+            langs = [filter_lang] if isinstance(filter_lang, str) else filter_lang
+            self.env['hide.view.nodes'].sudo().search([('model_name', 'in', model_names)])._refresh_page_labels(langs)
+        return res
@@ -1,46 +1,52 @@
-from odoo import fields, models, api, _
-from odoo.http import request
+from odoo import fields, models, api, tools, _
+from .query_prepare import get_request_company_id, get_policy_snapshot, is_policy_enforced
 
 class ir_ui_menu(models.Model):
     _inherit = 'ir.ui.menu'
 
+    def _get_access_management_menu_policy(self):
+        """ Return the fingerprint of the policy of the user and the ids of the
+        menus it hides, their submenus included, or ``(None, frozenset())``
+        when the access management does not apply. """
+        if self.env.su or not self.env.uid or not is_policy_enforced(self.env):
+            return None, frozenset()
+        snapshot = get_policy_snapshot(self.env, get_request_company_id(self.env))
+        if not snapshot['hidden_menu_ids']:
+            return snapshot['fingerprint'], frozenset()
+        return snapshot['fingerprint'], self._get_access_management_hidden_menus(
+            snapshot['fingerprint'], snapshot['hidden_menu_ids'])
+
     @api.model
-    def search(self, args, offset=0, limit=None, order=None):
-        ids = super(ir_ui_menu, self).search(args, offset=0, limit=None, order=order)
-        all_menu =ids.ids
-        # user = self.env.user
-        # # user.clear_caches()
-        # self.env['ir.ui.view'].sudo().clear_caches()
-        # request.registry.clear_cache()
-        # self.sudo().clear_caches()
-        try:
-            cids = request.httprequest.cookies.get('cids') and request.httprequest.cookies.get('cids').split('-')[0] or self.env.company.id
-            for menu_id in self.env.user.access_management_ids.filtered(lambda line: line.is_apply_on_without_company == True or int(cids) in line.company_ids.ids).mapped('hide_menu_ids.menu_id'):
-                if menu_id in all_menu:
-                    all_menu.remove(menu_id)
-                # menu_id = self.browse(menu_id)
-                # if menu_id in ids:
-                #     ids = ids - menu_id
-            # if offset:
-            #     ids = ids[offset:]
-            # if limit:
-            #     ids = ids[:limit]
-        except:
-            pass
-        return self.browse(all_menu)
-        # return len(ids) if count else ids
-    
-    @api.model_create_multi
-    def create(self, vals_list):
-        res = super(ir_ui_menu, self).create(vals_list)
-        menu_item_obj = self.env['menu.item'].sudo()
-        for record in res:
-            menu_item_obj.create({'name':record.display_name,'menu_id':record.id})
-        return res
+    @tools.ormcache('fingerprint')
+    def _get_access_management_hidden_menus(self, fingerprint, hidden_menu_ids):
+        menus = self.sudo().with_context(**{'ir.ui.menu.full_list': True, 'active_test': False})
+        return frozenset(menus.search([('id', 'child_of', list(hidden_menu_ids))]).ids)
 
-    def unlink(self):
-        menu_item_obj = self.env['menu.item'].sudo()
-        for record in self:
-            menu_item_obj.search([('menu_id','=',record.id)]).unlink()
-        return super(ir_ui_menu, self).unlink()
+    @api.model
+    def _visible_menu_ids(self, debug=False):
+        # the menus visible through the groups are cached by the standard
+        # method, the menus hidden by the policy are taken out of them
+        visible_ids = super(ir_ui_menu, self)._visible_menu_ids(debug)
+        if self.env.context.get('access_management_all_menus'):
+            return visible_ids
+        hidden_ids = self._get_access_management_menu_policy()[1]
+        return visible_ids - hidden_ids if hidden_ids else visible_ids
 
+    @api.model
+    def load_menus(self, debug):
+        fingerprint, hidden_ids = self._get_access_management_menu_policy()
+        if not hidden_ids:
+            return super(ir_ui_menu, self.with_context(access_management_all_menus=True)).load_menus(debug)
+        return self._load_access_management_menus(debug, fingerprint, hidden_ids)
+
+    @api.model
+    @tools.ormcache('self.env.uid', 'debug', 'self.env.lang', 'fingerprint')
+    def _load_access_management_menus(self, debug, fingerprint, hidden_ids):
+        """ Menus of ``load_menus`` without the ones hidden by the policy. The
+        standard cache is keyed on the user only, it is always filled without
+        hiding anything so that it can be shared by every company. """
+        menus = super(ir_ui_menu, self.with_context(access_management_all_menus=True)).load_menus(debug)
+        return {
+            key: dict(menu, children=[child_id for child_id in menu['children'] if child_id not in hidden_ids])
+            for key, menu in menus.items() if key not in hidden_ids
+        }
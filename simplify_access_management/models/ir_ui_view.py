@@ -1,86 +1,152 @@
-from odoo import models, SUPERUSER_ID, _
+from odoo import api, models, tools, SUPERUSER_ID, _
 from odoo.tools.translate import _
 from odoo.http import request
 import ast
-from .query_prepare import search_data
+from .query_prepare import get_policy_snapshot, instrument_hook, observe_duration, count_cache_lookups, \
+    count_cache_misses
+
+# hide.field flags applied by the field hook
+HIDE_FIELD_FLAGS = ('external_link', 'invisible', 'readonly', 'required')
+
+
+def _node_model(self, node, name_manager, node_info):
+    return name_manager.model._name
+
+
+# ir.ui.view fields changing the combined arch of a model
+VIEW_ARCH_FIELDS = {'arch', 'arch_base', 'arch_db', 'arch_fs', 'inherit_id', 'mode', 'active', 'model', 'priority'}
+
 
 class ir_ui_view(models.Model):
     _inherit = 'ir.ui.view'
 
+    @api.model_create_multi
+    def create(self, vals_list):
+        res = super(ir_ui_view, self).create(vals_list)
+        self.env['store.nodes.scan.queue'].sudo()._enqueue(res.mapped('model'))
+        return res
+
+    def write(self, vals):
+        if not VIEW_ARCH_FIELDS.intersection(vals):
+            return super(ir_ui_view, self).write(vals)
+        # only the model is fetched, not the arch of every view of a module update
+        self.fetch(['model'])
+        model_names = set(self.mapped('model'))
+        res = super(ir_ui_view, self).write(vals)
+        self.fetch(['model'])
+        self.env['store.nodes.scan.queue'].sudo()._enqueue(model_names | set(self.mapped('model')))
+        return res
+
+    @observe_duration('access_management_view_postprocess_seconds')
+    def postprocess_and_fields(self, node, model=None, **options):
+        return super(ir_ui_view, self).postprocess_and_fields(node, model=model, **options)
+
+    def _get_access_management_node_index(self, model_name):
+        """ Return the view nodes of ``model_name`` hidden by the access policy
+        of the current user, see ``_compile_access_management_node_index``. """
+        snapshot = get_policy_snapshot(self.env)
+        return self._compile_access_management_node_index(model_name, snapshot['fingerprint'])
+
+    @count_cache_lookups('view_nodes')
+    @api.model
+    @tools.ormcache('model_name', 'fingerprint', 'self.env.lang')
+    @count_cache_misses('view_nodes')
+    def _compile_access_management_node_index(self, model_name, fingerprint):
+        """
+        Index the hide.field, hide.view.nodes and hide.filters.groups rules of
+        ``model_name`` by node name, so that the postprocessing hooks are plain
+        lookups. The fingerprint identifies the rules of the policy, users
+        sharing a policy share the index.
+
+        :return: dict to be treated as read-only
+        """
+        rules = get_policy_snapshot(self.env)['rules']
+        index = {
+            'fields': {},
+            'labels': set(),
+            'buttons': set(),
+            'pages': set(),
+            'page_names': set(),
+            'links': set(),
+            'settings_apps': set(),
+            'filters': set(),
+        }
+
+        field_rules = rules['hide.field'].get(model_name, ())
+        for hide_field in self.env['hide.field'].sudo().browse([rule_id for rule_id, _flags in field_rules]):
+            flags = frozenset(flag for flag in HIDE_FIELD_FLAGS if hide_field[flag])
+            for field_id in hide_field.field_id:
+                index['fields'][field_id.name] = index['fields'].get(field_id.name, frozenset()) | flags
+                index['labels'].add((field_id.name, field_id.field_description))
+
+        node_rules = rules['hide.view.nodes'].get(model_name, ())
+        hide_nodes = self.env['hide.view.nodes'].sudo().browse([rule_id for rule_id, _flags in node_rules])
+        index['buttons'].update(hide_nodes.btn_store_model_nodes_ids.mapped('attribute_name'))
+        for tab in hide_nodes.page_store_model_nodes_ids:
+            # label_index is built when the rule is saved and when translations are loaded
+            label = (tab.label_index or {}).get(self.env.lang, tab.attribute_string)
+            if label:
+                index['pages'].add(label)
+            else:
+                index['page_names'].add(tab.attribute_name)
+            index['settings_apps'].add(tab.attribute_name)
+        for link in hide_nodes.link_store_model_nodes_ids:
+            index['links'].add(_(link.attribute_name))
+
+        filter_rules = rules['hide.filters.groups'].get(model_name, ())
+        hide_filters = self.env['hide.filters.groups'].sudo().browse([rule_id for rule_id, _flags in filter_rules])
+        index['filters'].update(hide_filters.filters_store_model_nodes_ids.mapped('attribute_name'))
+        index['filters'].update(hide_filters.groups_store_model_nodes_ids.mapped('attribute_name'))
+        for key in ('buttons', 'page_names', 'links', 'settings_apps', 'filters'):
+            index[key] -= {False, None}
+        return index
+
+    @instrument_hook('_postprocess_tag_field', model=_node_model)
     def _postprocess_tag_field(self, node, name_manager, node_info):
         super()._postprocess_tag_field(node, name_manager, node_info)
         try:
-            # hide_field_obj = self.env['hide.field'].sudo()
-            # hide_fields = hide_field_obj.search(
-            #             [('model_id.model', '=', name_manager.model._name), ('access_management_id.active', '=', True),
-            #              ('access_management_id.user_ids', 'in', request.env.uid)])
-            
-            # hide_fields -= hide_fields.filtered(lambda x: x.access_management_id.is_apply_on_without_company == False and self.env.company.id not in x.access_management_id.company_ids.ids)
-
-            hide_fields = search_data(self, 'hide.field', name_manager.model._name)
-            if node.tag == 'field' or node.tag == 'label':
-                for hide_field in hide_fields:
-                    for field_id in hide_field.field_id:
-                        # print(node.get('name'), '\n')
-                        if (node.tag == 'field' and node.get('name') == field_id.name) or (
-                                node.tag == 'label' and 'for' in node.attrib.keys() and node.attrib[
-                            'for'] == field_id.name):
-                            # if node.tag == 'field':
-                            if hide_field.external_link:
-                                options_dict = {}
-                                if 'widget' in node.attrib.keys():
-                                    if node.attrib['widget'] == 'product_configurator' or node.attrib['widget'] == 'many2one_avatar_user':
-                                        del node.attrib['widget']
-                                        
-                                if 'options' in node.attrib.keys():
-                                    options_dict = ast.literal_eval(node.attrib['options'])
-                                    options_dict.update({"no_edit": True, "no_create": True, "no_open": True})
-                                    node.attrib['options'] = str(options_dict)
-                                else:
-                                    # node.attrib.update({'can_create': 'false', 'can_write': 'false','no_open':'true'})
-                                    options_dict.update({'no_create': True, 'no_edit': True,'no_open': True})
-                                    node.attrib['options'] = str(options_dict)
-                                    
-                                # node.attrib.update({'can_create': 'false', 'can_write': 'false','no_open':'true'})
-                                    
-                            if hide_field.invisible:
-                                node_info['column_invisible'] = True
-                                node.set('column_invisible', 'True')
-                                node_info['invisible'] = True
-                                node.set('invisible', '1')
-                            if hide_field.readonly:
-                                node_info['readonly'] = True
-                                node.set('readonly', '1')
-                                node.set('force_save', '1')
-                            if hide_field.required:
-                                node_info['required'] = True
-                                node.set('required', '1')
+            hide_flags = False
+            if node.tag == 'field':
+                hide_flags = self._get_access_management_node_index(name_manager.model._name)['fields'].get(node.get('name'))
+            if hide_flags:
+                if 'external_link' in hide_flags:
+                    options_dict = {}
+                    if 'widget' in node.attrib.keys():
+                        if node.attrib['widget'] == 'product_configurator' or node.attrib['widget'] == 'many2one_avatar_user':
+                            del node.attrib['widget']
+
+                    if 'options' in node.attrib.keys():
+                        options_dict = ast.literal_eval(node.attrib['options'])
+                        options_dict.update({"no_edit": True, "no_create": True, "no_open": True})
+                        node.attrib['options'] = str(options_dict)
+                    else:
+                        options_dict.update({'no_create': True, 'no_edit': True,'no_open': True})
+                        node.attrib['options'] = str(options_dict)
+
+                if 'invisible' in hide_flags:
+                    node_info['column_invisible'] = True
+                    node.set('column_invisible', 'True')
+                    node_info['invisible'] = True
+                    node.set('invisible', '1')
+                if 'readonly' in hide_flags:
+                    node_info['readonly'] = True
+                    node.set('readonly', '1')
+                    node.set('force_save', '1')
+                if 'required' in hide_flags:
+                    node_info['required'] = True
+                    node.set('required', '1')
 
         except Exception:
             pass
 
+    @instrument_hook('_postprocess_tag_button', model=_node_model)
     def _postprocess_tag_button(self, node, name_manager, node_info):
         # Hide Any Button
         postprocessor = getattr(super(ir_ui_view, self), '_postprocess_tag_button', False)
         if postprocessor:
             super(ir_ui_view, self)._postprocess_tag_button(node, name_manager, node_info)
 
-        hide = None
-        # hide_button_obj = self.env['hide.view.nodes']
-        # hide_button_ids = hide_button_obj.sudo().search(
-        #     [('model_id.model', '=', name_manager.model._name), ('access_management_id.active', '=', True),
-        #      ('access_management_id.user_ids', 'in', request.env.uid)])
-        
-        # hide_button_ids -= hide_button_ids.filtered(lambda x: x.access_management_id.is_apply_on_without_company == False and self.env.company.id not in x.access_management_id.company_ids.ids)
-        hide_button_ids = search_data(self, 'hide.view.nodes', name_manager.model._name)
-        # Filtered with same env user and current model
-        btn_store_model_nodes_ids = hide_button_ids.mapped('btn_store_model_nodes_ids') if hide_button_ids else False
-        # translation_obj = self.env['ir.translation']
-        if btn_store_model_nodes_ids:
-            for btn in btn_store_model_nodes_ids:
-                if btn.attribute_name == node.get('name'):
-                    hide = [btn]
-                    break
+        hide = node.get('name') in self._get_access_management_node_index(name_manager.model._name)['buttons']
         if hide:
             node.set('invisible', '1')
             if 'attrs' in node.attrib.keys() and node.attrib['attrs']:
@@ -89,38 +155,15 @@ class ir_ui_view(models.Model):
 
         return None
 
+    @instrument_hook('_postprocess_tag_page', model=_node_model)
     def _postprocess_tag_page(self, node, name_manager, node_info):
         # Hide Any Notebook Page
         postprocessor = getattr(super(ir_ui_view, self), '_postprocess_tag_page', False)
         if postprocessor:
             super(ir_ui_view, self)._postprocess_tag_page(node, name_manager, node_info)
 
-        hide = None
-        # hide_tab_obj = self.env['hide.view.nodes']
-        # hide_tab_ids = hide_tab_obj.sudo().search([('model_id.model', '=', name_manager.model._name),
-        #                                            ('access_management_id.active', '=', True),
-        #                                            ('access_management_id.user_ids', 'in', request.env.uid)])
-        
-        # hide_tab_ids -= hide_tab_ids.filtered(lambda x: x.access_management_id.is_apply_on_without_company == False and self.env.company.id not in x.access_management_id.company_ids.ids)
-        hide_tab_ids = search_data(self, 'hide.view.nodes', name_manager.model._name)
-        page_store_model_nodes_ids = hide_tab_ids.mapped('page_store_model_nodes_ids') if hide_tab_ids else False
-        if page_store_model_nodes_ids:
-
-            for tab in page_store_model_nodes_ids:
-                attribute_string = tab.attribute_string
-                if tab.lang_code != self.env.lang:
-                    field = self.env['ir.ui.view']._fields['arch_db']
-                    translation_dictionary = field.get_translation_dictionary(
-                        self.with_context(lang=tab.lang_code).arch_db,
-                        {self.env.lang: self.with_context(lang=self.env.lang)['arch_db']})
-                    attribute_string = translation_dictionary[attribute_string][self.env.lang]
-                    if not attribute_string:
-                        if tab.attribute_name == node.attrib.get('name'):
-                            hide = [tab]
-                            break
-                if attribute_string == node.get('string'):
-                    hide = [tab]
-                    break
+        index = self._get_access_management_node_index(name_manager.model._name)
+        hide = node.get('string') in index['pages'] or node.attrib.get('name') in index['page_names']
         if hide:
             node.set('invisible', '1')
             if 'attrs' in node.attrib.keys() and node.attrib['attrs']:
@@ -130,26 +173,14 @@ class ir_ui_view(models.Model):
 
         return None
 
+    @instrument_hook('_postprocess_tag_a', model=_node_model)
     def _postprocess_tag_a(self, node, name_manager, node_info):
         # Hide Any Notebook Page
         postprocessor = getattr(super(ir_ui_view, self), '_postprocess_tag_a', False)
         if postprocessor:
             super(ir_ui_view, self)._postprocess_tag_page(node, name_manager, node_info)
 
-        hide = None
-        # hide_tab_obj = self.env['hide.view.nodes']
-        # hide_tab_ids = hide_tab_obj.sudo().search([('model_id.model', '=', name_manager.model._name),
-        #                                            ('access_management_id.active', '=', True),
-        #                                            ('access_management_id.user_ids', 'in', request.env.uid)])
-        
-        # hide_tab_ids -= hide_tab_ids.filtered(lambda x: x.access_management_id.is_apply_on_without_company == False and self.env.company.id not in x.access_management_id.company_ids.ids)
-        hide_tab_ids = search_data(self, 'hide.view.nodes', name_manager.model._name)
-        link_store_model_nodes_ids = hide_tab_ids.mapped('link_store_model_nodes_ids') if hide_tab_ids else False
-        if link_store_model_nodes_ids:
-            for link in link_store_model_nodes_ids:
-                if _(link.attribute_name) == node.get('name'):
-                    hide = [link]
-                    break
+        hide = node.get('name') in self._get_access_management_node_index(name_manager.model._name)['links']
         if hide:
             node.set('invisible', '1')
             if 'attrs' in node.attrib.keys() and node.attrib['attrs']:
@@ -159,36 +190,21 @@ class ir_ui_view(models.Model):
 
         return None
 
+    @instrument_hook('_postprocess_tag_div', model=_node_model)
     def _postprocess_tag_div(self, node, name_manager, node_info):
         # Hide Any Notebook Page
         postprocessor = getattr(super(ir_ui_view, self), '_postprocess_tag_div', False)
         if postprocessor:
             super(ir_ui_view, self)._postprocess_tag_page(node, name_manager, node_info)
 
-        # hide_button_obj = self.env['hide.view.nodes']
-        # setting_tabs = hide_button_obj.sudo().search([('model_id.model', '=', name_manager.model._name),
-        #                                                ('access_management_id.active', '=', True),
-        #                                                ('access_management_id.user_ids', 'in', request.env.uid)])
-        
-        # setting_tabs -= setting_tabs.filtered(lambda x: x.access_management_id.is_apply_on_without_company == False and self.env.company.id not in x.access_management_id.company_ids.ids)
-        setting_tabs = search_data(self, 'hide.view.nodes', name_manager.model._name)
         if name_manager.model._name == 'res.config.settings' and node.tag == 'app' and node.get('string'):
-            setting_tabs = setting_tabs.mapped('page_store_model_nodes_ids') if setting_tabs else False
-            for setting_tab in setting_tabs:
-                attribute_string = setting_tab.attribute_string
-                if setting_tab.lang_code != self.env.lang:
-                    field = self.env['ir.ui.view']._fields['arch_db']
-                    translation_dictionary = field.get_translation_dictionary(
-                        self.with_context(lang=setting_tab.lang_code).arch_db,
-                        {self.env.lang: self.with_context(lang=self.env.lang)['arch_db']})
-                    attribute_string = translation_dictionary[attribute_string][self.env.lang]
-                if node.get('data-key') == setting_tab.attribute_name:
-                    # if node.get('string') == attribute_string and node.get('data-key') == setting_tab.attribute_name:
-                    node_info['invisible'] = True
-                    node.set('invisible', '1')
+            if node.get('data-key') in self._get_access_management_node_index(name_manager.model._name)['settings_apps']:
+                node_info['invisible'] = True
+                node.set('invisible', '1')
 
         return None
 
+    @instrument_hook('_postprocess_tag_filter', model=_node_model)
     def _postprocess_tag_filter(self, node, name_manager, node_info):
         # Hide Any Notebook Page
         postprocessor = getattr(super(ir_ui_view, self), '_postprocess_tag_filter', False)
@@ -196,44 +212,18 @@ class ir_ui_view(models.Model):
             super(ir_ui_view, self)._postprocess_tag_page(node, name_manager, node_info)
 
         if node.tag == 'filter' or node.tag == 'group':
-
-            # hide_filter_group_obj = self.env['hide.filters.groups'].sudo().search(
-            #     [('model_id.model', '=', name_manager.model._name), ('access_management_id.active', '=', True),
-            #      ('access_management_id.user_ids', 'in', request.env.uid)])
-            
-            # hide_filter_group_obj -= hide_filter_group_obj.filtered(lambda x: x.access_management_id.is_apply_on_without_company == False and self.env.company.id not in x.access_management_id.company_ids.ids)
-            hide_filter_group_obj = search_data(self, 'hide.filters.groups', name_manager.model._name)
-            if hide_filter_group_obj:
-                for hide_field_obj in hide_filter_group_obj:
-                    for hide_filter in hide_field_obj.filters_store_model_nodes_ids.mapped('attribute_name'):
-                        if hide_filter == node.get('name', False):
-                            node_info['invisible'] = True
-                            node.set('invisible', '1')
-                    for hide_field_obj in hide_filter_group_obj:
-                        for hide_filter in hide_field_obj.groups_store_model_nodes_ids.mapped('attribute_name'):
-                            if hide_filter == node.get('name', False):
-                                node_info['invisible'] = True
-                                node.set('invisible', '1')
+            if node.get('name', False) in self._get_access_management_node_index(name_manager.model._name)['filters']:
+                node_info['invisible'] = True
+                node.set('invisible', '1')
         return None
         
+    @instrument_hook('_postprocess_tag_label', model=_node_model)
     def _postprocess_tag_label(self, node, name_manager, node_info):
         postprocessor = getattr(super(ir_ui_view, self), '_postprocess_tag_label', False)
-        hide_field_obj = self.env['hide.field'].sudo()
         if postprocessor:
             super(ir_ui_view, self)._postprocess_tag_label(node, name_manager, node_info)
             if node.get('for'):
-                # hide_lable = hide_field_obj.search([('model_id.model','=',name_manager.model._name),
-                #                                     ('access_management_id.active','=',True),
-                #                                     ('access_management_id.user_ids','in',request.env.uid)])
-                
-                # hide_lable -= hide_lable.filtered(lambda x: x.access_management_id.is_apply_on_without_company == False and self.env.company.id not in x.access_management_id.company_ids.ids)
-                hide_lable = search_data(self, 'hide.field', name_manager.model._name)
-                if hide_lable:
-                    for hide_field in hide_lable:
-                        for field_id in hide_field.field_id:
-                            if node.get('for') == field_id.name and node.get('string') == field_id.field_description:
-                                node_info['invisible'] = True
-                                node.set('invisible', '1')
-
-            
-
+                labels = self._get_access_management_node_index(name_manager.model._name)['labels']
+                if (node.get('for'), node.get('string')) in labels:
+                    node_info['invisible'] = True
+                    node.set('invisible', '1')
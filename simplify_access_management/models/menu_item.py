@@ -1,9 +1,31 @@
-from odoo import api, fields, models
+from odoo import api, fields, models, tools
+from odoo.tools import SQL
 
 
 class menu_item(models.Model):
+    """ Menus offered to the access packs, read straight from ir.ui.menu. """
     _name = 'menu.item'
     _description = "Menu Item"
+    _auto = False
 
-    name = fields.Char('Menu')
-    menu_id = fields.Integer('Menu ID')
\ No newline at end of file
+    name = fields.Char('Menu', readonly=True)
+    menu_id = fields.Integer('Menu ID', readonly=True)
+
+    def init(self):
+        tools.drop_view_if_exists(self.env.cr, self._table)
+        # same path as the complete name of the menu, in the source language
+        self.env.cr.execute(SQL(
+            """CREATE OR REPLACE VIEW %s AS (
+                   WITH RECURSIVE menu_path AS (
+                       SELECT menu.id, (menu.name->>'en_US')::varchar AS name
+                       FROM ir_ui_menu AS menu
+                       WHERE menu.parent_id IS NULL
+                       UNION ALL
+                       SELECT menu.id, (parent.name || '/' || (menu.name->>'en_US'))::varchar
+                       FROM ir_ui_menu AS menu
+                       JOIN menu_path AS parent ON parent.id = menu.parent_id
+                   )
+                   SELECT id, name, id AS menu_id FROM menu_path
+               )""",
+            SQL.identifier(self._table),
+        ))
@@ -2,254 +2,199 @@ from odoo import api, fields, models, tools, _
 from odoo.exceptions import UserError, AccessError
 from odoo.osv import expression
 from odoo.tools.safe_eval import safe_eval
-from odoo.addons.advanced_web_domain_widget.models.domain_prepare import prepare_domain_v2,compute_domain
-from odoo.tools.sql import SQL
-from .query_prepare import search_data
+from odoo.addons.advanced_web_domain_widget.models.domain_prepare import prepare_domain_v2, compute_domain, get_date_bucket
+from .query_prepare import search_data, get_policy_snapshot, get_view_policy, get_transaction_decisions, get_access_guard, \
+    is_policy_enforced, instrument_hook, partner_users_domain
 
 
 
 class BaseModel(models.AbstractModel):
     _inherit = 'base'
 
+    def _get_access_management_fingerprint(self):
+        if not is_policy_enforced(self.env):
+            return None
+        return get_policy_snapshot(self.env)['fingerprint']
+
+    def _get_view_cache_key(self, view_id=None, view_type='form', **options):
+        # the arch is postprocessed with the access policy of the user, users
+        # sharing the same policy share the same cached views
+        key = super()._get_view_cache_key(view_id, view_type, **options)
+        return key + (self._get_access_management_fingerprint(),)
+
     @api.model
     def get_views(self, views, options=None):
         res = super().get_views(views, options)
-        form_toolbar = res['views'].get('form', {}).get('toolbar') or False
-        tree_toolbar = res['views'].get('list', {}).get('toolbar') or False
-        # remove_action = self.env['remove.action'].sudo().search(
-        #     [('access_management_id.active', '=', True),
-        #      ('access_management_id', 'in', self.env.user.access_management_ids.ids),
-        #      ('model_id.model', '=', self._name)])
-        
-        # remove_action -= remove_action.filtered(lambda x: x.access_management_id.is_apply_on_without_company == False and self.env.company.id not in x.access_management_id.company_ids.ids)
-        remove_action = search_data(self, 'remove.action', search_model=self._name)
-        if remove_action:
-            if form_toolbar or tree_toolbar:
-                remove_server_action = remove_action.mapped('server_action_ids.action_id').ids
-                remove_print_action = remove_action.mapped('report_action_ids.action_id').ids
-            if form_toolbar:
-                if res['views']['form']['toolbar'].get('action', False):
-                    action = [rec for rec in res['views']['form']['toolbar']['action'] if
-                            rec.get('id', False) not in remove_server_action]
-                    res['views']['form']['toolbar']['action'] = action
-                if res['views']['form']['toolbar'].get('print', False):
-                    prints = [rec for rec in res['views']['form']['toolbar']['print'] if
-                            rec.get('id', False) not in remove_print_action]
-                    res['views']['form']['toolbar']['print'] = prints
-            if tree_toolbar:
-                if res['views']['list']['toolbar'].get('action', False):
-                    action = [rec for rec in res['views']['list']['toolbar']['action'] if
-                            rec.get('id', False) not in remove_server_action]
-                    res['views']['list']['toolbar']['action'] = action
-                if res['views']['list']['toolbar'].get('print', False):
-                    prints = [rec for rec in res['views']['list']['toolbar']['print'] if
-                            rec.get('id', False) not in remove_print_action]
-                    res['views']['list']['toolbar']['print'] = prints
-      
+        view_policy = get_view_policy(self.env, self._name)
+        hidden_actions = {
+            'action': view_policy['hidden_server_actions'],
+            'print': view_policy['hidden_report_actions'],
+        }
+        for view_type in ['form', 'list']:
+            toolbar = res['views'].get(view_type, {}).get('toolbar') or False
+            if not toolbar:
+                continue
+            for key, action_ids in hidden_actions.items():
+                if action_ids and toolbar.get(key, False):
+                    toolbar[key] = [rec for rec in toolbar[key] if rec.get('id', False) not in action_ids]
         return res
 
     @api.model
     def load_views(self, views, options=None):
-        actions_and_prints = []
-        # remove_action = self.env['remove.action'].sudo().search([('access_management_id.active', '=', True),
-        #                                         ('access_management_id', 'in',self.env.user.access_management_ids.ids),
-        #                                         ('model_id.model', '=', self._name)])
-        # remove_action -= remove_action.filtered(lambda x: x.access_management_id.is_apply_on_without_company == False and self.env.company.id not in x.access_management_id.company_ids.ids)
-        remove_action = search_data(self, 'remove.action', search_model=self._name)
-        for access in remove_action:
-            actions_and_prints = actions_and_prints + access.mapped('report_action_ids.action_id').ids
-            actions_and_prints = actions_and_prints + access.mapped('server_action_ids.action_id').ids
-            for view_data in access.view_data_ids:
-                for view_data_list in views:
-                    if view_data.techname == view_data_list[1]:
-                        views.pop(views.index(view_data_list))
+        view_policy = get_view_policy(self.env, self._name)
+        actions_and_prints = view_policy['hidden_server_actions'] | view_policy['hidden_report_actions']
+        if view_policy['hidden_views']:
+            views = [view for view in views if view[1] not in view_policy['hidden_views']]
 
         res = super(BaseModel, self).load_views(views, options=options)
 
-        if 'fields_views' in res.keys():
+        if actions_and_prints and 'fields_views' in res.keys():
             for view in ['list', 'form']:
-                if view in res['fields_views'].keys():
-                    if 'toolbar' in res['fields_views'][view].keys():
-                        if 'print' in res['fields_views'][view]['toolbar'].keys():
-                            prints = res['fields_views'][view]['toolbar']['print'][:]
-                            for pri in prints:
-                                if pri['id'] in actions_and_prints:
-                                    res['fields_views'][view]['toolbar']['print'].remove(pri)
-                        if 'print' in res['fields_views'][view]['toolbar'].keys():
-                            action = res['fields_views'][view]['toolbar']['action'][:]
-                            for act in action:
-                                if act['id'] in actions_and_prints:
-                                    res['fields_views'][view]['toolbar']['action'].remove(act)
+                toolbar = res['fields_views'].get(view, {}).get('toolbar')
+                if not toolbar:
+                    continue
+                for key in ['print', 'action']:
+                    if key in toolbar.keys():
+                        toolbar[key] = [act for act in toolbar[key] if act['id'] not in actions_and_prints]
         return res
 
+    @instrument_hook('_get_view')
     @api.model
     def _get_view(self, view_id=None, view_type='form', **options):
         arch, view = super()._get_view(view_id, view_type, **options)
-        readonly_access_id = search_data(self, 'access.management', condition=('readonly', '=', True), operator='AND')
-        access_recs = search_data(self, 'access.domain.ah', search_model=self._name)
-        access_model_recs = search_data(self, 'remove.action', search_model=self._name)
+        view_policy = get_view_policy(self.env, self._name)
 
-        if view_type == 'form':
-            access_management_id = search_data(self, 'access.management', condition=('hide_chatter', '=', True),operator='AND', limit=1)
-            if access_management_id:
-                for chatter_path in arch.xpath("//chatter"):
-                    chatter_path.getparent().remove(chatter_path)
-            else:
-                hide_chatter_id = search_data(self, 'hide.chatter', search_model=self._name, condition=('hide_chatter', '=', True), operator='AND', limit=1)
-                if hide_chatter_id:
-                    for chatter_path in arch.xpath("//chatter"):
-                        chatter_path.getparent().remove(chatter_path)
+        if view_type == 'form' and view_policy['hide_chatter']:
+            for chatter_path in arch.xpath("//chatter"):
+                chatter_path.getparent().remove(chatter_path)
 
         if view_type in ['kanban', 'list']:
-            restrict_import = search_data(self, 'access.management', condition=('hide_import', '=', True), operator='AND', limit=1)
-            if restrict_import or (access_model_recs and access_model_recs.filtered(lambda x: x.restrict_import)):
-                doc = arch
-                doc.attrib.update({'import': 'false'})
-                arch = doc
-
-            restrict_export = search_data(self, 'access.management', condition=('hide_export', '=', True), operator='AND', limit=1)
+            if view_policy['restrict_import']:
+                arch.attrib.update({'import': 'false'})
+            if view_policy['restrict_export']:
+                arch.attrib.update({'export_xlsx': 'false'})
 
-            if access_model_recs and (access_model_recs.filtered(lambda x: x.restrict_export) or restrict_export):
-                doc = arch
-                doc.attrib.update({'export_xlsx': 'false'})
-                arch = doc
-
-        if readonly_access_id:
+        if view_policy['readonly']:
             if view_type in ['form', 'list', 'kanban', 'gantt','pivot','graph']:
                 arch.attrib.update({'create': 'false', 'delete': 'false', 'edit': 'false'})
-        # if readonly_access_id:
-        #     if view_type == 'form':
-        #         arch.attrib.update({'create': 'false', 'delete': 'false', 'edit': 'false'})
-
-        #     if view_type == 'list':
-        #         arch.attrib.update({'create': 'false', 'delete': 'false', 'edit': 'false'})
-
-        #     if view_type == 'kanban':
-        #         arch.attrib.update({'create': 'false', 'delete': 'false', 'edit': 'false'})
-
         else:
-
-            if access_model_recs:
-                delete = 'true'
-                edit = 'true'
-                create = 'true'
-                for access_model in access_model_recs:
-                    if access_model.restrict_create:
-                        create = 'false'
-                    if access_model.restrict_edit:
-                        edit = 'false'
-                    if access_model.restrict_delete:
-                        delete = 'false'
-
+            for rights in (view_policy['remove_action_rights'], view_policy['access_domain_rights']):
+                if not rights:
+                    continue
                 if view_type in ['form', 'list', 'kanban', 'gantt','pivot','graph']:
-                            arch.attrib.update({'create': create, 'delete': delete, 'edit': edit})
-
+                    arch.attrib.update(rights)
                 elif view_type == 'calendar':
                     if 'js_class' in arch.attrib:
                         arch.attrib.update({'js_class':''})
-                    arch.attrib.update({'create': create, 'delete': delete, 'edit': edit})
-
-            if access_recs:
-                delete = 'false'
-                edit = 'false'
-                create = 'false'
-                for access_rec in access_recs:
-                    if access_rec.create_right:
-                        create = 'true'
-                    if access_rec.write_right:
-                        edit = 'true'
-                    if access_rec.delete_right:
-                        delete = 'true'
-
-                if view_type in ['form', 'list', 'kanban', 'gantt','pivot','graph']:
-                    arch.attrib.update({'create': create, 'delete': delete, 'edit': edit})
-
-                elif view_type == 'calendar':
-                    if 'js_class' in arch.attrib:
-                        arch.attrib.update({'js_class':''})
-                    arch.attrib.update({'create': create, 'delete': delete, 'edit': edit})
+                    arch.attrib.update(rights)
 
         return arch, view
 
     def _get_access_management_domain_record(self, model=False):
-        records = None
-        try:
-            if model:
-                self._cr.execute(SQL("SELECT id FROM ir_model WHERE model='%s'" % model))
-                model_numeric_id = self._cr.fetchone()[0]
-                if model_numeric_id and isinstance(model_numeric_id, int) and self.env.user:
-                    self._cr.execute(SQL("""
-                                    SELECT dm.id
-                                    FROM access_domain_ah as dm
-                                    WHERE dm.model_id=%s AND dm.access_management_id 
-                                    IN (SELECT am.id 
-                                        FROM access_management as am 
-                                        WHERE am.active='t' AND am.id 
-                                        IN (SELECT amusr.access_management_id
-                                            FROM access_management_users_rel_ah as amusr
-                                            WHERE amusr.user_id=%s))
-                                    """% (model_numeric_id, self.env.user.id)))
-                    records = self.env['access.domain.ah'].sudo().browse(row[0] for row in self._cr.fetchall())
-        except:
-            pass
-        return records
+        if not model:
+            return None
+        return search_data(self, 'access.domain.ah', model) or None
+
+    def _get_access_management_rule_domain(self, record):
+        domain_list = []
+        dom = safe_eval(record.domain) if record.domain else []
+        if dom:
+            dom = expression.normalize_domain(dom)
+            model_name = self._name
+            day = get_date_bucket(self.env)
+            if isinstance(dom, list):
+                for dom_tuple in dom:
+                    if isinstance(dom_tuple, tuple):
+                        compute_domain(dom_tuple, model_name, self.env)
+                        operator_value = dom_tuple[1]
+                        if operator_value == 'date_filter':
+                            domain_list += prepare_domain_v2(dom_tuple, day)
+                        else:
+                            domain_list.append(dom_tuple)
+                    else:
+                        domain_list.append(dom_tuple)
+        if not domain_list:
+            return expression.TRUE_DOMAIN
+        if self.sudo()._name == "res.partner":
+            domain_list = expression.OR([partner_users_domain(self.env), domain_list])
+        return domain_list
 
     def _check_access_management_right(self, mode=False, records=False):
-        access_flag = False
+        """
+        Check the records of ``self`` against the access.domain.ah lines
+        ``records`` for ``mode``. Records are allowed when any line granting
+        the mode matches them, which is evaluated in one search for the
+        whole recordset.
+
+        :return: ``access_flag``, the name of the checked ``access_rule`` and,
+            for write and unlink, the ``denied_records``
+        :rtype: dict
+        """
         access_rule = None
-        length = len(records.sudo()) if records.sudo() else 0
-        partner_ids = self.env['res.users'].sudo().search([]).mapped("partner_id.id")
-        partner_domain = ['|', ('id', 'in', partner_ids)]
+        domains = []
         for record in records.sudo():
-            if mode == 'create' and record.create_right:
-                access_flag = True
-                break
-            elif mode in ['write', 'unlink']:
-                access = False
-                if mode == 'unlink':
-                    access = record.delete_right
-                elif mode == 'write':
-                    access = record.write_right
-
-                domain_list = []
-                if self.sudo()._name == "res.partner":
-                    domain_list += partner_domain
-                dom = safe_eval(record.domain) if record.domain else []
-                if dom:
-                    dom = expression.normalize_domain(dom)
-                    model_name = self._name
-                    if isinstance(dom, list):
-                        for dom_tuple in dom:
-                            if isinstance(dom_tuple, tuple):
-                                compute_domain(dom_tuple, model_name)
-                                operator_value = dom_tuple[1]
-                                already_add = False
-                                if operator_value == 'date_filter':
-                                    domain_list += prepare_domain_v2(dom_tuple)
-                                else:
-                                    domain_list.append(dom_tuple)
-                            else:
-                                domain_list.append(dom_tuple)
-                search_domain = domain_list
-                if 'active' in self._fields:
-                    search_domain = ['|', ('active', '=', False), ('active', '=', True)] + search_domain
-                record_ids = self.search(search_domain)
-
-                if self in record_ids and access:
-                    access_flag = access
-                    break
             access_rule = record.access_management_id.name
-        return {'access_flag': access_flag, 'access_rule': access_rule}
+            if mode == 'create':
+                if record.create_right:
+                    return {'access_flag': True, 'access_rule': access_rule}
+            elif mode in ['write', 'unlink']:
+                access = record.delete_right if mode == 'unlink' else record.write_right
+                if access:
+                    domains.append(self._get_access_management_rule_domain(record))
+        if mode not in ['write', 'unlink']:
+            return {'access_flag': False, 'access_rule': access_rule}
+
+        denied_records = self
+        if domains:
+            search_domain = expression.AND([[('id', 'in', self.ids)], expression.OR(domains)])
+            denied_records -= self.with_context(active_test=False).search(search_domain)
+        return {'access_flag': not denied_records, 'access_rule': access_rule, 'denied_records': denied_records}
+
+    def _is_access_management_applied(self):
+        guard = get_access_guard(self.env)
+        return guard['enforced'] and self._name in guard['domain_models']
+
+    @instrument_hook('_check_access_management_records')
+    def _check_access_management_records(self, mode):
+        if not self or not self._is_access_management_applied():
+            return
+        # records already authorized for this mode and policy in the transaction
+        version = get_policy_snapshot(self.env)['version']
+        decisions = get_transaction_decisions(self.env)
+        records = self.browse([
+            record_id for record_id in self._ids
+            if (self._name, record_id, mode, version) not in decisions
+        ])
+        if not records:
+            return
+        access_domain_ah_ids = records._get_access_management_domain_record(model=self._name)
+        if access_domain_ah_ids:
+            flag = records._check_access_management_right(mode=mode, records=access_domain_ah_ids)
+            if not flag['access_flag']:
+                flag['denied_records']._display_access_management_error(mode=mode, rule=flag['access_rule'])
+        decisions.update((self._name, record_id, mode, version) for record_id in records._ids)
+
+    @instrument_hook('_check_access_management_create')
+    def _check_access_management_create(self):
+        access_domain_ah_ids = self._get_access_management_domain_record(model=self._name)
+        if access_domain_ah_ids:
+            flag = self._check_access_management_right(mode='create', records=access_domain_ah_ids)
+            if not flag['access_flag']:
+                self._display_access_management_error(mode='create', rule=flag['access_rule'])
 
     def _display_access_management_error(self, mode=None, rule=None):
         if mode and rule:
+            names = self[:10].mapped('display_name') if mode in ['write', 'unlink'] else []
+            if len(self) > 10:
+                names.append('...')
+            record = "', '".join(names)
             msg_heads = {
                 'unlink': _(
                     "Due to access management rule,\nYou are not allowed to delete record '%(record)s' from (%(document_model)s) model.",
-                    record=self.display_name, document_model=self._name),
+                    record=record, document_model=self._name),
                 'write': _(
                     "Due to access management rule,\nYou are not allowed to edit record '%(record)s' from (%(document_model)s) model.",
-                    record=self.display_name, document_model=self._name),
+                    record=record, document_model=self._name),
                 'create': _(
                     "Due to access management rule,\nYou are not allowed to create records from (%(document_model)s) model.",
                     document_model=self.display_name),
@@ -263,57 +208,21 @@ class BaseModel(models.AbstractModel):
             raise AccessError(msg)
 
     def unlink(self):
-        value = self.env['ir.config_parameter'].sudo().search([('key', '=', 'uninstall_simplify_access_management')],
-                                                              limit=1).value
-        if not value:
-            for rec in self:
-                if rec._name:
-                    access_domain_ah_ids = rec._get_access_management_domain_record(model=rec._name)
-                    if access_domain_ah_ids:
-                        access_domain_ah_ids = access_domain_ah_ids.filtered(
-                            lambda line: self.env.company in line.access_management_id.company_ids)
-                    if access_domain_ah_ids:
-                        flag = rec._check_access_management_right(mode='unlink', records=access_domain_ah_ids)
-                        unlink_flag = flag['access_flag']
-                        access_rule = flag['access_rule']
-                        if not unlink_flag:
-                            rec._display_access_management_error(mode='unlink', rule=access_rule)
+        if self._name:
+            self._check_access_management_records('unlink')
 
         return super().unlink()
 
     def write(self, vals):
-        value = self.env['ir.config_parameter'].sudo().search([('key', '=', 'uninstall_simplify_access_management')],
-                                                              limit=1).value
-        if not value:
-            for rec in self:
-                if rec._name:
-                    access_domain_ah_ids = rec._get_access_management_domain_record(model=rec._name)
-                    if access_domain_ah_ids:
-                        access_domain_ah_ids = access_domain_ah_ids.filtered(
-                            lambda line: self.env.company in line.access_management_id.company_ids)
-                    if access_domain_ah_ids:
-                        flag = rec._check_access_management_right(mode='write', records=access_domain_ah_ids)
-                        write_flag = flag['access_flag']
-                        access_rule = flag['access_rule']
-                        if not write_flag:
-                            rec._display_access_management_error(mode='write', rule=access_rule)
+        if self._name:
+            self._check_access_management_records('write')
         return super().write(vals)
     
 
     @api.model_create_multi
     @api.returns('self', lambda value: value.id)
     def create(self, vals_list):
-        value = self.env['ir.config_parameter'].sudo().search([('key','=','uninstall_simplify_access_management')],limit=1).value
-        if not value:
-            if self._name:
-                access_domain_ah_ids = self._get_access_management_domain_record(model=self._name)
-                if access_domain_ah_ids:
-                    access_domain_ah_ids = access_domain_ah_ids.filtered(lambda line: self.env.company in line.access_management_id.company_ids)
-                if access_domain_ah_ids:
-                        flag = self._check_access_management_right(mode='create',records=access_domain_ah_ids)
-                        create_flag = flag['access_flag']
-                        access_rule = flag['access_rule']
-                        if not create_flag:
-                            self._display_access_management_error(mode='create',rule=access_rule)
+        if self._name and self._is_access_management_applied():
+            self._check_access_management_create()
 
         return super().create(vals_list)
@@ -1,129 +1,893 @@
+import functools
+import hashlib
+import itertools
+import bisect
+import logging
+import os
+import random
+import threading
+import time
+
+from odoo.http import request
 from odoo.tools import SQL
 
+_logger = logging.getLogger(__name__)
 
-def search_data(self, from_model, search_model=False, condition=False, operator=False, limit=0):
+# Rule lines hanging off an access pack, each targeting a single model.
+POLICY_RULE_MODELS = (
+    'remove.action',
+    'hide.field',
+    'hide.view.nodes',
+    'hide.chatter',
+    'hide.filters.groups',
+    'access.domain.ah',
+)
+
+# Bits of the per-model rights granted by access.domain.ah lines.
+ACCESS_RIGHT_BITS = {
+    'read': 1,
+    'create': 2,
+    'write': 4,
+    'unlink': 8,
+}
+ACCESS_RIGHT_FLAGS = {
+    'read': 'read_right',
+    'create': 'create_right',
+    'write': 'write_right',
+    'unlink': 'delete_right',
+}
+
+def partner_users_domain(env):
+    """ Domain of the partners of users, archived ones included, which stay
+    reachable whatever the access domains say. The users are selected with
+    sudo, the partners of the users the current user cannot see included,
+    as a subquery so the domain keeps its size. """
+    users = env['res.users'].sudo().with_context(active_test=False)._search([])
+    return [('id', 'in', users.subselect('partner_id'))]
+
+# Database sequence numbering the access policy versions of the users, see
+# ``bump_policy_versions``. Sequences are not transactional, so a version
+# drawn by a transaction rolled back is never handed out again.
+POLICY_VERSION_SEQUENCE = 'access_management_policy_version_seq'
+
+# Every compiled snapshot gets its own version, so that anything derived from
+# a snapshot can tell whether the policy it was computed with is still current.
+_policy_versions = itertools.count(1)
+
+
+def _boolean_columns(model):
+    return sorted(
+        name for name, field in model._fields.items()
+        if field.type == 'boolean' and field.store and name != 'active'
+    )
+
+
+# Table holding the rules of every user and company, see ``refresh_effective_rules``.
+EFFECTIVE_RULE_TABLE = 'access_effective_rule'
+# rule_kind of the rows holding the packs and the hidden menus
+PACK_RULE_KIND = 'access.management'
+MENU_RULE_KIND = 'ir.ui.menu'
+# company_id of the rows of the packs applied without company
+ANY_COMPANY = 0
+
+
+def _pack_scope_query(user_ids):
+    """ Active packs with the users and companies they apply to, as
+    ``(pack_id, user_id, company_id)``. """
+    return SQL(
+        """SELECT am.id AS pack_id, rel.user_id, scope.company_id
+           FROM access_management AS am
+           JOIN access_management_users_rel_ah AS rel ON rel.access_management_id = am.id
+           CROSS JOIN LATERAL (
+               SELECT %(any_company)s AS company_id WHERE am.is_apply_on_without_company = TRUE
+               UNION ALL
+               SELECT rel_com.company_id FROM access_management_comapnay_rel AS rel_com
+               WHERE rel_com.access_management_id = am.id AND am.is_apply_on_without_company IS NOT TRUE
+           ) AS scope
+           WHERE am.active = TRUE AND %(user_filter)s""",
+        any_company=ANY_COMPANY,
+        user_filter=SQL("rel.user_id IN %s", user_ids) if user_ids is not None else SQL("TRUE"),
+    )
+
+
+def _flags_object(alias, flags):
+    """ jsonb ``{flag: [ids of the rows of alias having it]}`` aggregate. """
+    if not flags:
+        return SQL("'{}'::jsonb")
+    return SQL("jsonb_strip_nulls(jsonb_build_object(%s))", SQL(", ").join(
+        SQL("%s, array_agg(%s ORDER BY %s) FILTER (WHERE %s)",
+            flag, SQL.identifier(alias, 'id'), SQL.identifier(alias, 'id'), SQL.identifier(alias, flag))
+        for flag in flags
+    ))
+
+
+def refresh_effective_rules(env, user_ids=None):
+    """
+    Rebuild the rows of ``access_effective_rule`` of the users, of everyone
+    when ``user_ids`` is ``None``. A row holds, for a user, a company and a
+    model, the ids of the lines of one rule model applying to them with their
+    flags pre-merged as ``{flag: [rule ids]}``. The packs and the hidden menus
+    are stored the same way under ``PACK_RULE_KIND`` and ``MENU_RULE_KIND``.
+    Rows of packs applied without company have ``ANY_COMPANY`` as company.
+    """
+    if user_ids is not None:
+        user_ids = tuple(sorted({user_id for user_id in user_ids if user_id}))
+        if not user_ids:
+            return
+    cr = env.cr
+    env.flush_all()
+    table = SQL.identifier(EFFECTIVE_RULE_TABLE)
+    cr.execute(SQL(
+        "DELETE FROM %s WHERE %s",
+        table, SQL("user_id IN %s", user_ids) if user_ids is not None else SQL("TRUE"),
+    ))
+    scope = _pack_scope_query(user_ids)
+    pack_flags = _boolean_columns(env['access.management'])
+    cr.execute(SQL(
+        """INSERT INTO %(table)s (user_id, company_id, rule_kind, model, rule_ids, flags, signature)
+           SELECT scope.user_id, scope.company_id, %(kind)s, '', array_agg(am.id ORDER BY am.id), %(flags)s,
+                  md5(string_agg(am.id || ':' || am.write_date, ',' ORDER BY am.id))
+           FROM (%(scope)s) AS scope
+           JOIN access_management AS am ON am.id = scope.pack_id
+           GROUP BY scope.user_id, scope.company_id""",
+        table=table, kind=PACK_RULE_KIND, flags=_flags_object('am', pack_flags), scope=scope,
+    ))
+    for rule_model in POLICY_RULE_MODELS:
+        cr.execute(SQL(
+            """INSERT INTO %(table)s (user_id, company_id, rule_kind, model, rule_ids, flags, signature)
+               SELECT scope.user_id, scope.company_id, %(kind)s, im.model, array_agg(ft.id ORDER BY ft.id), %(flags)s,
+                      md5(string_agg(ft.id || ':' || ft.write_date, ',' ORDER BY ft.id))
+               FROM (%(scope)s) AS scope
+               JOIN %(rule_table)s AS ft ON ft.access_management_id = scope.pack_id
+               JOIN ir_model AS im ON im.id = ft.model_id
+               GROUP BY scope.user_id, scope.company_id, im.model""",
+            table=table, kind=rule_model, scope=scope,
+            flags=_flags_object('ft', _boolean_columns(env[rule_model])),
+            rule_table=SQL.identifier(env[rule_model]._table),
+        ))
+    cr.execute(SQL(
+        """INSERT INTO %(table)s (user_id, company_id, rule_kind, model, rule_ids, flags, signature)
+           SELECT scope.user_id, scope.company_id, %(kind)s, '', array_agg(DISTINCT rel.menu_id), '{}'::jsonb, ''
+           FROM (%(scope)s) AS scope
+           JOIN access_management_menu_rel_ah AS rel ON rel.access_management_id = scope.pack_id
+           JOIN ir_ui_menu AS menu ON menu.id = rel.menu_id
+           GROUP BY scope.user_id, scope.company_id""",
+        table=table, kind=MENU_RULE_KIND, scope=scope,
+    ))
+
+
+def _row_entries(rule_ids, flags):
+    flag_ids = {flag: set(ids) for flag, ids in (flags or {}).items() if ids}
+    return [
+        (rule_id, frozenset(flag for flag, ids in flag_ids.items() if rule_id in ids))
+        for rule_id in rule_ids
+    ]
+
+
+def compile_policy(env, uid, company_id):
+    """
+    Compile every access rule applying to ``uid`` in ``company_id`` into plain
+    python data, so that it can be shared through the registry cache. The rules
+    are read from ``access_effective_rule`` with a single indexed query.
+
+    The snapshot is a dict with:
+
+    * ``packs``: ``{pack_id: frozenset(flags set on the pack)}``
+    * ``rules``: ``{rule_model: {model_name: ((rule_id, frozenset(flags)), ...)}}``
+    * ``hidden_menu_ids``: ``frozenset`` of the ``ir.ui.menu`` ids to hide
+    * ``fingerprint``: digest of the packs and rule lines, including their
+      last update, equal for users sharing the same policy
+    * ``version``: a number identifying this compilation in the process
+
+    :return: the compiled snapshot, to be treated as read-only
+    :rtype: dict
+    """
+    env.cr.execute(SQL(
+        """SELECT rule_kind, model, rule_ids, flags, signature
+           FROM %s
+           WHERE user_id = %s AND company_id IN %s
+           ORDER BY rule_kind, model, company_id""",
+        SQL.identifier(EFFECTIVE_RULE_TABLE), uid, (ANY_COMPANY, company_id or ANY_COMPANY),
+    ))
+    packs = {}
+    rules = {rule_model: {} for rule_model in POLICY_RULE_MODELS}
+    hidden_menu_ids = set()
+    signatures = []
+    for rule_kind, model_name, rule_ids, flags, signature in env.cr.fetchall():
+        signatures.append((rule_kind, model_name, signature))
+        if rule_kind == PACK_RULE_KIND:
+            packs.update(_row_entries(rule_ids, flags))
+        elif rule_kind == MENU_RULE_KIND:
+            hidden_menu_ids.update(rule_ids)
+        elif rule_kind in rules:
+            rules[rule_kind].setdefault(model_name, {}).update(_row_entries(rule_ids, flags))
+    for by_model in rules.values():
+        for model_name, entries in by_model.items():
+            by_model[model_name] = tuple(sorted(entries.items()))
+
+    return {
+        'packs': packs,
+        'rules': rules,
+        'hidden_menu_ids': frozenset(hidden_menu_ids),
+        'fingerprint': hashlib.sha1(repr(sorted(signatures)).encode()).hexdigest(),
+        'version': next(_policy_versions),
+    }
+
+
+def compile_access_rights(snapshot):
+    """
+    Fold a policy snapshot into the rights checked by ``ir.model.access``.
+
+    :return: ``(readonly, {model_name: ACCESS_RIGHT_BITS mask})``, the mask
+        holding the modes granted by the applied access.domain.ah lines
+    :rtype: tuple
+    """
+    readonly = any('readonly' in flags for flags in snapshot['packs'].values())
+    rights = {}
+    for model_name, entries in snapshot['rules']['access.domain.ah'].items():
+        mask = 0
+        for _rule_id, flags in entries:
+            if 'apply_domain' not in flags:
+                continue
+            for mode, flag in ACCESS_RIGHT_FLAGS.items():
+                if flag in flags:
+                    mask |= ACCESS_RIGHT_BITS[mode]
+        if mask:
+            rights[model_name] = mask
+    return readonly, rights
+
+
+def compute_rights_matrix(env, user_ids=None, company_ids=None, model_names=None):
+    """
+    Compute the effective model rights of every user in every of its
+    companies, the way ``ir.model.access.check`` grants them: the group
+    rights, extended by the applied access.domain.ah lines and limited to
+    reading by the read-only packs.
+
+    Everything is loaded with a handful of queries and combined as bitsets:
+    each user is a bit, so that the users having a right on a model in a
+    company are a single integer built with ``|``, ``&`` and ``~``.
+
+    :return: dict with ``users`` (the user ids, the position of a user being
+        its bit), ``rights`` (``{(company_id, model_name): bitsets}``, one
+        bitset per mode of ``ACCESS_RIGHT_BITS``) and ``company_ids``
+    :rtype: dict
+    """
+    cr = env.cr
+    env.flush_all()
+    cr.execute(SQL(
+        "SELECT id FROM res_users WHERE active AND %s ORDER BY id",
+        SQL("id IN %s", tuple(user_ids)) if user_ids else SQL("TRUE"),
+    ))
+    users = [row[0] for row in cr.fetchall()]
+    matrix = {'users': users, 'company_ids': [], 'rights': {}}
+    if not users:
+        return matrix
+    user_bits = {user_id: 1 << index for index, user_id in enumerate(users)}
+    everyone = (1 << len(users)) - 1
+
+    cr.execute(SQL(
+        "SELECT cid, user_id FROM res_company_users_rel WHERE user_id IN %s AND %s",
+        tuple(users), SQL("cid IN %s", tuple(company_ids)) if company_ids else SQL("TRUE"),
+    ))
+    company_users = {}
+    for company_id, user_id in cr.fetchall():
+        company_users[company_id] = company_users.get(company_id, 0) | user_bits[user_id]
+    matrix['company_ids'] = sorted(company_users)
+
+    registry = env.registry
+    model_names = sorted(
+        model_name for model_name in (model_names or registry)
+        if model_name in registry and not registry[model_name]._abstract and not registry[model_name]._transient
+    )
+    if not model_names:
+        return matrix
+    modes = list(ACCESS_RIGHT_BITS)
+
+    # group rights, the users of a group being those of res_groups_users_rel
+    # which holds the implied groups as well
+    cr.execute(SQL("SELECT gid, uid FROM res_groups_users_rel WHERE uid IN %s", tuple(users)))
+    group_users = {}
+    for group_id, user_id in cr.fetchall():
+        group_users[group_id] = group_users.get(group_id, 0) | user_bits[user_id]
+    cr.execute(SQL(
+        """SELECT im.model, acl.group_id, acl.perm_read, acl.perm_create, acl.perm_write, acl.perm_unlink
+           FROM ir_model_access AS acl
+           JOIN ir_model AS im ON im.id = acl.model_id
+           WHERE acl.active AND im.model IN %s""",
+        tuple(model_names),
+    ))
+    base = {}
+    for model_name, group_id, *perms in cr.fetchall():
+        members = everyone if group_id is None else group_users.get(group_id, 0)
+        bitsets = base.setdefault(model_name, [0] * len(modes))
+        for index, perm in enumerate(perms):
+            if perm:
+                bitsets[index] |= members
+
+    # rights granted by access.domain.ah lines and read-only packs, per
+    # company, ANY_COMPANY holding those of the packs applied without company
+    grants = {}
+    readonly = {}
+    if is_policy_enforced(env):
+        cr.execute(SQL(
+            """SELECT user_id, company_id, rule_kind, model, flags
+               FROM %s
+               WHERE rule_kind IN %s AND user_id IN %s""",
+            SQL.identifier(EFFECTIVE_RULE_TABLE), (PACK_RULE_KIND, 'access.domain.ah'), tuple(users),
+        ))
+        for user_id, company_id, rule_kind, model_name, flags in cr.fetchall():
+            bit = user_bits[user_id]
+            if rule_kind == PACK_RULE_KIND:
+                if flags.get('readonly'):
+                    readonly[company_id] = readonly.get(company_id, 0) | bit
+                continue
+            applied = set(flags.get('apply_domain') or ())
+            bitsets = grants.setdefault((company_id, model_name), [0] * len(modes))
+            for index, mode in enumerate(modes):
+                if applied.intersection(flags.get(ACCESS_RIGHT_FLAGS[mode]) or ()):
+                    bitsets[index] |= bit
+
+    no_grant = [0] * len(modes)
+    for company_id in matrix['company_ids']:
+        members = company_users[company_id]
+        writable = ~(readonly.get(ANY_COMPANY, 0) | readonly.get(company_id, 0))
+        for model_name in model_names:
+            model_base = base.get(model_name, no_grant)
+            any_grant = grants.get((ANY_COMPANY, model_name), no_grant)
+            company_grant = grants.get((company_id, model_name), no_grant)
+            bitsets = []
+            for index, mode in enumerate(modes):
+                bits = (model_base[index] | any_grant[index] | company_grant[index]) & members
+                if mode != 'read':
+                    bits &= writable
+                bitsets.append(bits)
+            if any(bitsets):
+                matrix['rights'][company_id, model_name] = tuple(bitsets)
+    return matrix
+
+
+def iter_rights_matrix(matrix):
+    """ Unfold ``compute_rights_matrix`` into ``(user_id, company_id,
+    model_name, ACCESS_RIGHT_BITS mask)``, skipping the users without right. """
+    users = matrix['users']
+    masks = list(ACCESS_RIGHT_BITS.values())
+    for (company_id, model_name), bitsets in matrix['rights'].items():
+        holders = 0
+        for bits in bitsets:
+            holders |= bits
+        while holders:
+            bit = holders & -holders
+            holders ^= bit
+            mask = 0
+            for bits, mode_mask in zip(bitsets, masks):
+                if bits & bit:
+                    mask |= mode_mask
+            yield users[bit.bit_length() - 1], company_id, model_name, mask
+
+
+def compile_view_policy(env, snapshot, model_name):
+    """
+    Gather from a policy snapshot everything the view hooks of ``model_name``
+    need to rewrite arches and toolbars, with a single query for the views
+    and actions removed by the remove.action lines.
+
+    * ``readonly``: some pack is read-only
+    * ``hide_chatter``: the chatter is hidden by a pack or a hide.chatter line
+    * ``restrict_import`` / ``restrict_export``: import/export are hidden
+    * ``remove_action_rights`` / ``access_domain_rights``: ``{'create', 'edit',
+      'delete'}`` arch attributes from remove.action / access.domain.ah lines,
+      ``None`` when there is no such line
+    * ``hidden_views``: view types removed
+    * ``hidden_server_actions`` / ``hidden_report_actions``: ids of the
+      ``ir.actions.actions`` removed from the toolbars
+
+    :rtype: dict
+    """
+    pack_flags = set().union(*snapshot['packs'].values())
+    remove_actions = snapshot['rules']['remove.action'].get(model_name, ())
+    access_domains = snapshot['rules']['access.domain.ah'].get(model_name, ())
+    chatters = snapshot['rules']['hide.chatter'].get(model_name, ())
+    remove_flags = set().union(*(flags for _rule_id, flags in remove_actions))
+
+    policy = {
+        'readonly': 'readonly' in pack_flags,
+        'hide_chatter': 'hide_chatter' in pack_flags
+                        or any('hide_chatter' in flags for _rule_id, flags in chatters),
+        'restrict_import': 'hide_import' in pack_flags or 'restrict_import' in remove_flags,
+        'restrict_export': bool(remove_actions) and ('hide_export' in pack_flags or 'restrict_export' in remove_flags),
+        'remove_action_rights': None,
+        'access_domain_rights': None,
+        'hidden_views': frozenset(),
+        'hidden_server_actions': frozenset(),
+        'hidden_report_actions': frozenset(),
+    }
+    if remove_actions:
+        policy['remove_action_rights'] = {
+            'create': 'false' if 'restrict_create' in remove_flags else 'true',
+            'edit': 'false' if 'restrict_edit' in remove_flags else 'true',
+            'delete': 'false' if 'restrict_delete' in remove_flags else 'true',
+        }
+        env.cr.execute(SQL(
+            """SELECT
+                   ARRAY(SELECT DISTINCT vd.techname
+                         FROM remove_action_view_data_rel_ah AS rel
+                         JOIN view_data AS vd ON vd.id = rel.view_data_id
+                         WHERE rel.remove_action_id IN %(ids)s),
+                   ARRAY(SELECT DISTINCT rel.server_action_id
+                         FROM remove_action_server_action_data_rel_ah AS rel
+                         WHERE rel.remove_action_id IN %(ids)s),
+                   ARRAY(SELECT DISTINCT rel.report_action_id
+                         FROM remove_action_report_action_data_rel_ah AS rel
+                         WHERE rel.remove_action_id IN %(ids)s)""",
+            ids=tuple(rule_id for rule_id, _flags in remove_actions),
+        ))
+        views, server_actions, report_actions = env.cr.fetchone()
+        policy['hidden_views'] = frozenset(views)
+        policy['hidden_server_actions'] = frozenset(server_actions)
+        policy['hidden_report_actions'] = frozenset(report_actions)
+    if access_domains:
+        access_flags = set().union(*(flags for _rule_id, flags in access_domains))
+        policy['access_domain_rights'] = {
+            'create': 'true' if 'create_right' in access_flags else 'false',
+            'edit': 'true' if 'write_right' in access_flags else 'false',
+            'delete': 'true' if 'delete_right' in access_flags else 'false',
+        }
+    return policy
+
+
+CHATTER_FLAGS = ('hide_send_mail', 'hide_log_notes', 'hide_schedule_activity')
+
+
+def compile_chatter_policy(snapshot):
+    """
+    Fold a policy snapshot into the chatter buttons to hide.
+
+    :return: ``{'default': flags, 'models': {model_name: flags}}``, the flags
+        being ``{flag: bool}`` for ``CHATTER_FLAGS``; ``default`` applies to
+        the models without hide.chatter line
+    :rtype: dict
+    """
+    pack_flags = set().union(*snapshot['packs'].values())
+    if 'hide_chatter' in pack_flags:
+        pack_flags.update(CHATTER_FLAGS)
+    policy = {
+        'default': {flag: flag in pack_flags for flag in CHATTER_FLAGS},
+        'models': {},
+    }
+    for model_name, entries in snapshot['rules']['hide.chatter'].items():
+        model_flags = set(pack_flags).union(*(flags for _rule_id, flags in entries))
+        if 'hide_chatter' in model_flags:
+            model_flags.update(CHATTER_FLAGS)
+        policy['models'][model_name] = {flag: flag in model_flags for flag in CHATTER_FLAGS}
+    return policy
+
+
+def compute_access_guard(cr):
+    """
+    Resolve the process wide facts the access hooks test before anything else.
+
+    * ``enforced``: the module is installed and not being uninstalled
+    * ``readonly``: some pack applying to a user is read-only
+    * ``domain_models``: models having an access.domain.ah line applying to
+      a user, the only models create/write/unlink/check and the ir.rule
+      domains have to look at
+
+    Both are read from ``access_effective_rule``.
+
+    :rtype: dict
+    """
+    guard = {'enforced': False, 'readonly': False, 'domain_models': frozenset()}
+    cr.execute(SQL(
+        """SELECT NOT EXISTS (
+               SELECT 1 FROM ir_config_parameter WHERE key = 'uninstall_simplify_access_management'
+           ) AND EXISTS (
+               SELECT 1 FROM ir_module_module WHERE name = 'simplify_access_management' AND state = 'installed'
+           )"""
+    ))
+    guard['enforced'] = cr.fetchone()[0]
+    if not guard['enforced']:
+        return guard
+
+    cr.execute(SQL(
+        """SELECT EXISTS (
+               SELECT 1 FROM %s WHERE rule_kind = %s AND flags ? 'readonly'
+           )""",
+        SQL.identifier(EFFECTIVE_RULE_TABLE), PACK_RULE_KIND,
+    ))
+    guard['readonly'] = cr.fetchone()[0]
+    cr.execute(SQL(
+        "SELECT DISTINCT model FROM %s WHERE rule_kind = %s",
+        SQL.identifier(EFFECTIVE_RULE_TABLE), 'access.domain.ah',
+    ))
+    guard['domain_models'] = frozenset(row[0] for row in cr.fetchall())
+    return guard
+
+
+def get_access_guard(env):
+    # registry loading goes through module states that must not be cached
+    if not env.registry.ready:
+        return compute_access_guard(env.cr)
+    return env['access.management']._get_access_guard()
+
+
+def read_access_guard(env):
+    """ Return the guard flags of the current transaction, pending updates
+    included, to be given to ``refresh_access_guard`` after a change. """
+    env.flush_all()
+    return compute_access_guard(env.cr)
+
+
+def refresh_access_guard(env, previous_guard):
+    """
+    Clear the registry cache when the flags of ``compute_access_guard`` no
+    longer match ``previous_guard``, read with ``read_access_guard`` before
+    the change. The cached guard is not a baseline: a worker may fill it from
+    the changed transaction. Anything depending on the policy of a single
+    user is keyed on its policy version instead, see ``bump_policy_versions``.
+    """
+    if read_access_guard(env) != previous_guard:
+        env.registry.clear_cache()
+        metric_inc('access_management_registry_cache_clears_total')
+
+
+def is_policy_enforced(env):
+    return get_access_guard(env)['enforced']
+
+
+def get_request_company_id(env):
+    """ Return the company selected in the web client, else the current one. """
+    cids = request and request.httprequest.cookies.get('cids')
+    if cids:
+        try:
+            return int(cids.split('-')[0])
+        except ValueError:
+            pass
+    return env.company.id
+
+
+def get_policy_version(env, uid=None):
+    """ Return the access policy version of ``uid``, the current user by default. """
+    return env['res.users'].sudo().browse(uid or env.uid).access_policy_version
+
+
+def bump_policy_versions(env, user_ids):
+    """
+    Rebuild the effective rules of the users and give them a new access policy
+    version, so that the policy data cached for them (snapshot, rights, rule
+    domains, views) is no longer used. The cache entries of the other users
+    are left untouched.
+
+    :param user_ids: ids of the users whose policy changed
+    """
+    user_ids = tuple(sorted({user_id for user_id in user_ids if user_id}))
+    if not user_ids:
+        return
+    refresh_effective_rules(env, user_ids)
+    metric_inc('access_management_policy_version_bumps_total', value=len(user_ids))
+    env.cr.execute(SQL(
+        "UPDATE res_users SET access_policy_version = nextval(%s) WHERE id IN %s",
+        POLICY_VERSION_SEQUENCE, user_ids,
+    ))
+    env['res.users'].invalidate_model(['access_policy_version'])
+
+
+def get_policy_snapshot(env, company_id=None):
+    """ Return the compiled access policy of the current user in ``company_id``,
+    the current company by default. """
+    return env['access.management']._get_policy_snapshot(
+        env.uid, company_id or env.company.id, get_policy_version(env))
+
+
+def get_view_policy(env, model_name, company_id=None):
+    """ Return the view policy of ``model_name`` for the current user in
+    ``company_id``, see ``compile_view_policy``. """
+    snapshot = get_policy_snapshot(env, company_id)
+    return env['access.management']._get_view_policy(model_name, snapshot['fingerprint'], snapshot)
+
+
+def get_transaction_decisions(env):
+    """
+    Return the set of ``(model, record id, mode, policy version)`` already
+    authorized in the current transaction. It lives in the precommit data of
+    the cursor, which is dropped on commit and on rollback.
+    """
+    return env.cr.precommit.data.setdefault('access_management.decisions', set())
+
+
+# Share of the calls of the access hooks measured, 0 or unset disables the
+# instrumentation, see ``instrument_hook``.
+INSTRUMENTATION_PARAM = 'simplify_access_management.instrumentation_rate'
+# seconds between two reads of the rate and two flushes of the aggregates
+INSTRUMENTATION_INTERVAL = 60
+
+_instrumentation_lock = threading.Lock()
+# {dbname: (rate, read at)}
+_instrumentation_rates = {}
+# {dbname: {(hook, model, uid): [calls, wall time, sql count, sql time, max wall time]}}
+_hook_stats = {}
+# {dbname: last flush}
+_hook_flushes = {}
+_instrumented_call = threading.local()
+
+
+def get_instrumentation_rate(env):
+    """ Return the share of the hook calls to measure in the database of
+    ``env``, the parameter being read again once per interval. """
+    dbname = env.cr.dbname
+    rate, read_at = _instrumentation_rates.get(dbname, (0.0, 0))
+    now = time.monotonic()
+    if now - read_at > INSTRUMENTATION_INTERVAL and env.registry.ready:
+        # stored first, reading the parameter may go through the hooks again
+        _instrumentation_rates[dbname] = (rate, now)
+        try:
+            rate = min(max(float(env['ir.config_parameter'].sudo().get_param(INSTRUMENTATION_PARAM) or 0), 0.0), 1.0)
+        except ValueError:
+            rate = 0.0
+        _instrumentation_rates[dbname] = (rate, now)
+    return rate
+
+
+def record_hook_call(dbname, hook, model_name, uid, wall_time, sql_count, sql_time):
+    with _instrumentation_lock:
+        stats = _hook_stats.setdefault(dbname, {}).setdefault((hook, model_name, uid), [0, 0.0, 0, 0.0, 0.0])
+        stats[0] += 1
+        stats[1] += wall_time
+        stats[2] += sql_count
+        stats[3] += sql_time
+        stats[4] = max(stats[4], wall_time)
+
+
+def flush_hook_stats(registry, rate, force=False):
+    """ Write the aggregates of the process to ``access_hook_log`` in their
+    own transaction, once per interval unless ``force`` is set. """
+    dbname = registry.db_name
+    now = time.monotonic()
+    with _instrumentation_lock:
+        last_flush = _hook_flushes.setdefault(dbname, now)
+        if not force and now - last_flush < INSTRUMENTATION_INTERVAL:
+            return
+        stats = _hook_stats.pop(dbname, {})
+        _hook_flushes[dbname] = now
+    if not stats:
+        return
     try:
-        if from_model:
-            self.env[from_model].exists()
-            from_model_table = self.env[from_model]._table
-            company_ids = tuple(self.env.company.ids)
-            if condition:
-                if condition[0] in self.env[from_model]._fields:
-                    sql_condition = " ".join(map(str, condition))
-                    params = (self.env.user.id, company_ids)
-                    if from_model_table == 'access_management':
-                        sql_condition = "am." + sql_condition
-                        query = """SELECT am.id
-                                FROM access_management AS am
-                                WHERE am.active = TRUE
-                                AND EXISTS (
-                                    SELECT 1 FROM access_management_users_rel_ah AS rel 
-                                    WHERE rel.access_management_id = am.id AND rel.user_id = %s
-                                )
-                                AND (
-                                    am.is_apply_on_without_company = TRUE
-                                    OR EXISTS (
-                                        SELECT 1 FROM access_management_comapnay_rel AS rel_com
-                                        WHERE rel_com.access_management_id = am.id AND rel_com.company_id IN %s
-                                    )
-                                )
-                                {operator} {sql_condition}""".format(operator=operator, sql_condition=sql_condition)
-                        self._cr.execute(query, params)
-                        if limit > 0:
-                            row = self._cr.fetchone()
-                            result = row[0] if row else False
-                        else:
-                            result = [x[0] for x in self._cr.fetchall()]
-                        return self.env[from_model].sudo().browse(result)
-                    else:
-                        if search_model:
-                            self.env[search_model].exists()
-                            search_model_table = self.env[search_model]._table
-                            sql_condition = "ft." + sql_condition
-                            query = """SELECT ft.id
-                                    FROM {from_model_table} AS ft
-                                    WHERE EXISTS (
-                                        SELECT 1
-                                        FROM access_management AS am
-                                        JOIN access_management_users_rel_ah AS rel_user 
-                                        ON am.id = rel_user.access_management_id
-                                        WHERE rel_user.user_id = %s
-                                        AND am.active
-                                        AND am.id = ft.access_management_id
-                                    )
-                                    AND EXISTS (
-                                        SELECT 1
-                                        FROM ir_model AS im
-                                        WHERE im.id = ft.model_id
-                                        AND im.model = %s
-                                    )
-                                    AND (
-                                        (SELECT am.is_apply_on_without_company
-                                        FROM access_management am
-                                        WHERE am.id = ft.access_management_id)
-                                    OR EXISTS (
-                                        SELECT 1
-                                        FROM access_management_comapnay_rel AS rel_comp 
-                                        WHERE rel_comp.access_management_id = ft.access_management_id
-                                            AND rel_comp.company_id = %s
-                                    )
-                                    )
-                                    {operator} {sql_condition}""".format(from_model_table=from_model_table,operator=operator, sql_condition=sql_condition)
-                            self._cr.execute(query, (self.env.user.id, search_model, company_ids))
-                            if limit > 0:
-                                row = self._cr.fetchone()
-                                result = row[0] if row else False
-                            else:
-                                result = [x[0] for x in self._cr.fetchall()]
-                            return self.env[from_model].sudo().browse(result)   
-
-            else:
-                if from_model == 'access.management':
-                    pass
-                else:
-                    if search_model:
-                        
-                        self.env[search_model].exists()
-                        params = (self.env.user.id,search_model, company_ids)
-                     
-                        query = """SELECT ft.id
-                                    FROM {from_model_table} AS ft
-                                    WHERE EXISTS (
-                                        SELECT 1
-                                        FROM access_management AS am
-                                        JOIN access_management_users_rel_ah AS rel_user 
-                                        ON am.id = rel_user.access_management_id
-                                        WHERE rel_user.user_id = %s
-                                        AND am.active
-                                        AND am.id = ft.access_management_id
-                                    )
-                                    AND EXISTS (
-                                        SELECT 1
-                                        FROM ir_model AS im
-                                        WHERE im.id = ft.model_id
-                                        AND im.model = %s
-                                    )
-                                    AND (
-                                        (SELECT am.is_apply_on_without_company
-                                        FROM access_management am
-                                        WHERE am.id = ft.access_management_id)
-                                    OR EXISTS (
-                                        SELECT 1
-                                        FROM access_management_comapnay_rel AS rel_comp 
-                                        WHERE rel_comp.access_management_id = ft.access_management_id
-                                            AND rel_comp.company_id = %s
-                                    )
-                                    )"""
-                        self._cr.execute(query.format(from_model_table=from_model_table), params)
-                        if limit > 0:
-                            result = self._cr.fetchone()[0]
-                        else:
-                            result = [x[0] for x in self._cr.fetchall()]
-                        if result:
-                            return self.env[from_model].sudo().browse(result)
-                        else:
-                            return False    
-                    
+        with registry.cursor() as cr:
+            cr.execute(SQL(
+                """INSERT INTO access_hook_log (date, hook, model, user_id, sample_rate, calls, wall_time,
+                                                sql_count, sql_time, max_wall_time)
+                   SELECT now() AT TIME ZONE 'UTC', hook, model, NULLIF(user_id, 0), %s, calls, wall_time,
+                          sql_count, sql_time, max_wall_time
+                   FROM unnest(%s::varchar[], %s::varchar[], %s::int[], %s::int[], %s::float[],
+                               %s::int[], %s::float[], %s::float[])
+                        AS stat(hook, model, user_id, calls, wall_time, sql_count, sql_time, max_wall_time)
+                   WHERE NULLIF(user_id, 0) IS NULL OR EXISTS (SELECT 1 FROM res_users WHERE id = user_id)""",
+                rate,
+                [key[0] for key in stats], [key[1] or '' for key in stats], [key[2] or 0 for key in stats],
+                [values[0] for values in stats.values()],
+                # milliseconds
+                [values[1] * 1000 for values in stats.values()],
+                [values[2] for values in stats.values()],
+                [values[3] * 1000 for values in stats.values()],
+                [values[4] * 1000 for values in stats.values()],
+            ))
+    except Exception:
+        _logger.warning("Could not flush the access hook statistics", exc_info=True)
+
+
+def instrument_hook(hook, model=None):
+    """
+    Decorate an access hook so that a sample of its calls is measured: wall
+    time, number of queries and query time are added to the aggregates of the
+    process per hook, model and user, then flushed to ``access.hook.log``
+    periodically. Nested hooks are measured inclusively.
+
+    :param hook: name of the hook in the logs
+    :param model: function returning the model name from the arguments of
+        the call, the model of ``self`` by default
+    """
+    def decorator(method):
+        @functools.wraps(method)
+        def wrapper(self, *args, **kwargs):
+            env = self.env
+            rate = get_instrumentation_rate(env)
+            if not rate or (rate < 1 and random.random() >= rate):
+                return method(self, *args, **kwargs)
+            thread = threading.current_thread()
+            cr = env.cr
+            count = cr.sql_log_count
+            query_time = getattr(thread, 'query_time', 0.0)
+            depth = getattr(_instrumented_call, 'depth', 0)
+            _instrumented_call.depth = depth + 1
+            start = time.perf_counter()
+            try:
+                return method(self, *args, **kwargs)
+            finally:
+                wall_time = time.perf_counter() - start
+                _instrumented_call.depth = depth
+                model_name = model(self, *args, **kwargs) if model else self._name
+                record_hook_call(
+                    cr.dbname, hook, model_name or None, env.uid, wall_time, cr.sql_log_count - count,
+                    getattr(thread, 'query_time', 0.0) - query_time,
+                )
+                if not depth:
+                    flush_hook_stats(env.registry, rate)
+        return wrapper
+    return decorator
+
+
+# Metrics of the access engine kept by each process and served in the
+# Prometheus text format, see ``render_metrics``: {name: (type, help)}
+METRICS = {
+    'access_management_access_check_seconds': (
+        'histogram', "Duration of the ir.model.access checks, per mode."),
+    'access_management_rule_domain_seconds': (
+        'histogram', "Duration of the ir.rule domains computed on a cache miss."),
+    'access_management_view_postprocess_seconds': (
+        'histogram', "Duration of the postprocessing of the view arches."),
+    'access_management_registry_cache_clears_total': (
+        'counter', "Registry cache clears triggered by changes of the access packs and rules."),
+    'access_management_policy_version_bumps_total': (
+        'counter', "Users given a new access policy version."),
+    'access_management_cache_lookups_total': (
+        'counter', "Lookups of the access caches, per cache."),
+    'access_management_cache_misses_total': (
+        'counter', "Lookups of the access caches that computed the value, per cache."),
+    'access_management_cache_hit_ratio': (
+        'gauge', "Share of the lookups of the access caches answered from the cache, per cache."),
+}
+# upper bounds of the histogram buckets, in seconds
+METRIC_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+
+_metrics_lock = threading.Lock()
+# {(name, labels): value}
+_metric_counters = {}
+# {(name, labels): [count per bucket, +Inf included, ..., sum, count]}
+_metric_histograms = {}
+
+
+def metric_inc(name, labels=(), value=1):
+    """ Add ``value`` to a counter, ``labels`` being ``((label, value), ...)``. """
+    with _metrics_lock:
+        _metric_counters[name, labels] = _metric_counters.get((name, labels), 0) + value
+
+
+def metric_observe(name, seconds, labels=()):
+    """ Add a duration to a histogram. """
+    with _metrics_lock:
+        histogram = _metric_histograms.get((name, labels))
+        if histogram is None:
+            histogram = _metric_histograms[name, labels] = [0] * (len(METRIC_BUCKETS) + 1) + [0.0, 0]
+        histogram[bisect.bisect_left(METRIC_BUCKETS, seconds)] += 1
+        histogram[-2] += seconds
+        histogram[-1] += 1
+
+
+def observe_duration(name, labels=None):
+    """ Decorate a method so that its duration is added to the histogram
+    ``name``, ``labels`` computing the labels from the arguments. """
+    def decorator(method):
+        @functools.wraps(method)
+        def wrapper(self, *args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return method(self, *args, **kwargs)
+            finally:
+                metric_observe(name, time.perf_counter() - start, labels(self, *args, **kwargs) if labels else ())
+        return wrapper
+    return decorator
+
+
+def count_cache_lookups(cache, metric='access_management_cache_lookups_total'):
+    """ Decorate an ormcached method, above ``ormcache``, to count its lookups;
+    the same decorator with the misses metric, below ``ormcache``, counts the
+    lookups computing the value. """
+    labels = (('cache', cache),)
+
+    def decorator(method):
+        @functools.wraps(method)
+        def wrapper(self, *args, **kwargs):
+            metric_inc(metric, labels)
+            return method(self, *args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def count_cache_misses(cache):
+    return count_cache_lookups(cache, 'access_management_cache_misses_total')
+
+
+def _format_labels(labels):
+    if not labels:
+        return ''
+    return '{%s}' % ','.join(
+        '%s="%s"' % (label, str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n'))
+        for label, value in labels
+    )
+
+
+def render_metrics():
+    """ Return the metrics of the process in the Prometheus text format, the
+    ``worker`` label holding the pid of the process. """
+    worker = (('worker', str(os.getpid())),)
+    with _metrics_lock:
+        counters = dict(_metric_counters)
+        histograms = {key: list(values) for key, values in _metric_histograms.items()}
+    gauges = {}
+    for (name, labels), lookups in counters.items():
+        if name == 'access_management_cache_lookups_total' and lookups:
+            misses = counters.get(('access_management_cache_misses_total', labels), 0)
+            gauges['access_management_cache_hit_ratio', labels] = max(lookups - misses, 0) / lookups
+
+    lines = []
+    for name, (metric_type, description) in METRICS.items():
+        lines.append('# HELP %s %s' % (name, description))
+        lines.append('# TYPE %s %s' % (name, metric_type))
+        if metric_type == 'histogram':
+            for (metric_name, labels), values in sorted(histograms.items()):
+                if metric_name != name:
+                    continue
+                cumulated = 0
+                for bound, count in zip(METRIC_BUCKETS + (float('inf'),), values):
+                    cumulated += count
+                    le = '+Inf' if bound == float('inf') else repr(bound)
+                    lines.append('%s_bucket%s %d' % (name, _format_labels(worker + labels + (('le', le),)), cumulated))
+                lines.append('%s_sum%s %r' % (name, _format_labels(worker + labels), values[-2]))
+                lines.append('%s_count%s %d' % (name, _format_labels(worker + labels), values[-1]))
+        else:
+            values = counters if metric_type == 'counter' else gauges
+            for (metric_name, labels), value in sorted(values.items()):
+                if metric_name == name:
+                    lines.append('%s%s %r' % (name, _format_labels(worker + labels), value))
+    return '\n'.join(lines) + '\n'
+
+
+def _match_condition(flags, condition):
+    field_name, operator, value = condition
+    if operator in ('=', '=='):
+        return (field_name in flags) == bool(value)
+    if operator in ('!=', '<>'):
+        return (field_name in flags) != bool(value)
+    raise ValueError("Unsupported access policy condition %r" % (condition,))
+
+
+def _search_data_model(self, from_model, search_model=False, *args, **kwargs):
+    return search_model or from_model
+
+
+@instrument_hook('search_data', model=_search_data_model)
+def search_data(self, from_model, search_model=False, condition=False, operator=False, limit=0):
+    """
+    Return the access rules of ``from_model`` applying to the current user and
+    company, answered from the compiled policy snapshot.
+
+    :param from_model: ``access.management`` or one of ``POLICY_RULE_MODELS``
+    :param search_model: technical name of the model the rule lines target
+    :param condition: ``(boolean_field, '=', value)`` filter on the rules
+    :param operator: kept for compatibility, conditions are always AND-ed
+    :param limit: when positive, return at most one record
+    """
+    if not from_model:
+        return False
+    snapshot = get_policy_snapshot(self.env)
+    if from_model == 'access.management':
+        if not condition or condition[0] not in self.env[from_model]._fields:
+            return False
+        entries = snapshot['packs'].items()
+    else:
+        if not search_model or from_model not in snapshot['rules']:
             return False
-    except Exception as e:
-        raise e
\ No newline at end of file
+        if condition and condition[0] not in self.env[from_model]._fields:
+            return False
+        entries = snapshot['rules'][from_model].get(search_model, ())
+
+    result = [
+        record_id for record_id, flags in entries
+        if not condition or _match_condition(flags, condition)
+    ]
+    if not condition and not result:
+        return False
+    if limit > 0:
+        result = result[:1]
+    return self.env[from_model].sudo().browse(result)
+
@@ -1,6 +1,6 @@
 from odoo import fields, models, api, SUPERUSER_ID,_
 from odoo.exceptions import UserError, AccessDenied
-from .query_prepare import search_data
+from .query_prepare import search_data, bump_policy_versions, read_access_guard, refresh_access_guard
 import logging
 _logger = logging.getLogger(__name__)
 
@@ -8,9 +8,15 @@ class res_users(models.Model):
     _inherit = 'res.users'
 
     access_management_ids = fields.Many2many('access.management', 'access_management_users_rel_ah', 'user_id', 'access_management_id', 'Access Pack')
+    access_policy_version = fields.Integer('Access Policy Version', default=0, readonly=True, copy=False,
+                                           groups='base.group_system')
     
     def write(self, vals):
+        guard = read_access_guard(self.env) if 'access_management_ids' in vals else None
         res = super(res_users, self).write(vals)
+        if 'access_management_ids' in vals:
+            bump_policy_versions(self.env, self.ids)
+            refresh_access_guard(self.env, guard)
         for user in self:
             for access in user.sudo().access_management_ids:
                 if user.env.company in access.company_ids and access.readonly:
@@ -20,7 +26,12 @@ class res_users(models.Model):
 
     @api.model_create_multi
     def create(self, vals_list):
+        with_packs = any(vals.get('access_management_ids') for vals in vals_list)
+        guard = read_access_guard(self.env) if with_packs else None
         res = super(res_users, self).create(vals_list)
+        if with_packs:
+            bump_policy_versions(self.env, res.filtered('access_management_ids').ids)
+            refresh_access_guard(self.env, guard)
         for record in self:
             for access in record.sudo().access_management_ids:    
                 if self.env.company in access.company_ids and access.readonly:
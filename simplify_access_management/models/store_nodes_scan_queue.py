@@ -0,0 +1,63 @@
+import logging
+
+from odoo import api, fields, models
+from odoo.tools import SQL
+
+_logger = logging.getLogger(__name__)
+
+
+class store_nodes_scan_queue(models.Model):
+    """ Models whose views changed since their nodes were catalogued, the
+    catalogue is refreshed in the background by a cron. """
+    _name = 'store.nodes.scan.queue'
+    _description = 'Store Nodes Scan Queue'
+    _order = 'id'
+    _log_access = False
+
+    model_id = fields.Many2one('ir.model', string='Model', required=True, index=True, ondelete='cascade')
+
+    _sql_constraints = [
+        ('model_uniq', 'unique(model_id)', 'A model can only be queued once.'),
+    ]
+
+    @api.model
+    def _enqueue(self, model_names):
+        """ Queue the models for a new scan of their views. Only the models
+        already catalogued are queued, the others are scanned when a rule line
+        first selects them. """
+        model_names = tuple(sorted({name for name in model_names if name}))
+        if not model_names:
+            return
+        self.env.cr.execute(SQL(
+            """INSERT INTO %s (model_id)
+               SELECT im.id FROM ir_model AS im
+               WHERE im.model IN %s
+               AND (EXISTS (SELECT 1 FROM store_model_nodes AS node WHERE node.model_id = im.id)
+                    OR EXISTS (SELECT 1 FROM store_filters_groups AS node WHERE node.model_id = im.id))
+               ON CONFLICT (model_id) DO NOTHING""",
+            SQL.identifier(self._table), model_names,
+        ))
+        # trigger the cron once per transaction, however many views are saved
+        data = self.env.cr.precommit.data
+        if self.env.cr.rowcount and not data.get('access_management.scan_triggered'):
+            data['access_management.scan_triggered'] = True
+            cron = self.env.ref('simplify_access_management.ir_cron_scan_store_nodes', raise_if_not_found=False)
+            if cron:
+                cron._trigger()
+
+    @api.model
+    def _cron_scan_store_nodes(self, batch_size=20):
+        entries = self.search([], limit=batch_size)
+        for entry in entries:
+            model = entry.model_id
+            if model.model not in self.env or self.env[model.model]._abstract:
+                continue
+            try:
+                with self.env.cr.savepoint():
+                    self.env['store.model.nodes'].sudo()._scan_model_views(model)
+                    self.env['store.filters.groups'].sudo()._scan_model_views(model)
+            except Exception:
+                _logger.exception("Could not scan the views of %s", model.model)
+        done = len(entries)
+        entries.unlink()
+        self.env['ir.cron']._notify_progress(done=done, remaining=self.search_count([]))
@@ -0,0 +1,3 @@
+from . import test_hook_budgets
+from . import test_controller_budgets
+from . import test_access_guard
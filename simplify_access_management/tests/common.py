@@ -0,0 +1,104 @@
+import logging
+import time
+from contextlib import contextmanager
+
+from odoo import Command
+from odoo.tests.common import new_test_user
+
+_logger = logging.getLogger(__name__)
+
+# number of packs applying to the test user the budgets are checked with
+RULE_SET_SIZES = (1, 10, 50)
+
+
+class AccessBudgetCommon:
+    """ Packs of growing size applying to a test user, and helpers measuring
+    the queries the access hooks cost on top of them. The time is logged
+    only, it depends too much on the machine to fail a test.
+
+    Every pack carries the same kind of lines on res.partner, so that the
+    hooks have the same work to do whatever the number of packs: a hook whose
+    queries grow with the packs, their lines or the records is a regression.
+    """
+
+    @classmethod
+    def _setup_budget_data(cls):
+        cls.budget_user = new_test_user(
+            cls.env, login='sam_budget_user', groups='base.group_user,base.group_partner_manager')
+        cls.partner_model = cls.env['ir.model']._get('res.partner')
+        cls.partner_fields = cls.env['ir.model.fields'].search([
+            ('model', '=', 'res.partner'), ('name', 'in', ('phone', 'mobile', 'website', 'comment')),
+        ])
+        cls.hidden_menu = cls.env.ref('base.menu_administration')
+        cls.partners = cls.env['res.partner'].create([{'name': 'Budget %s' % index} for index in range(20)])
+
+    def _set_rule_set_size(self, size):
+        """ Create or delete packs of the test user until it has ``size`` of them. """
+        packs = self.env['access.management'].search([('user_ids', 'in', self.budget_user.ids)], order='id')
+        if len(packs) > size:
+            packs[size:].unlink()
+            return
+        self.env['access.management'].create([{
+            'name': 'Budget pack %s' % index,
+            'user_ids': [Command.set(self.budget_user.ids)],
+            'is_apply_on_without_company': True,
+            'hide_menu_ids': [Command.set(self.hidden_menu.ids)],
+            'hide_field_ids': [Command.create({
+                'model_id': self.partner_model.id,
+                'field_id': [Command.set(self.partner_fields.ids)],
+                'invisible': bool(index % 2),
+                'readonly': not index % 2,
+            })],
+            'remove_action_ids': [Command.create({
+                'model_id': self.partner_model.id,
+                'restrict_export': True,
+                'restrict_duplicate': True,
+            })],
+            'access_domain_ah_ids': [Command.create({
+                'model_id': self.partner_model.id,
+                'apply_domain': True,
+                'domain': "[('id', '!=', False)]",
+                'read_right': True,
+                'create_right': True,
+                'write_right': True,
+                'delete_right': True,
+            })],
+        } for index in range(len(packs), size)])
+
+    def _user_env(self):
+        return self.env(user=self.budget_user)
+
+    @contextmanager
+    def _measure(self, label, queries):
+        """ Fail when the block runs more than ``queries`` queries, pending
+        updates included, and log its duration. Yield a dict receiving the
+        measured ``queries``, to compare runs with each other. """
+        result = {}
+        self.env.flush_all()
+        count = self.env.cr.sql_log_count
+        start = time.perf_counter()
+        yield result
+        self.env.flush_all()
+        result['queries'] = self.env.cr.sql_log_count - count
+        result['seconds'] = time.perf_counter() - start
+        self.assertLessEqual(result['queries'], queries, "%s: %s queries, %s expected at most" % (
+            label, result['queries'], queries))
+        _logger.info("%s: %s queries in %.3fs", label, result['queries'], result['seconds'])
+
+    def _check_budget_per_size(self, label, func, queries, warm=True):
+        """ Run ``func`` in a fresh environment for every rule set size, the
+        registry caches warmed first unless ``warm`` is false. The queries have
+        to fit the budget and not to grow with the size. """
+        counts = {}
+        for size in RULE_SET_SIZES:
+            with self.subTest(rule_set_size=size):
+                self._set_rule_set_size(size)
+                if warm:
+                    func()
+                else:
+                    self.env.registry.clear_cache()
+                self.env.invalidate_all()
+                with self._measure('%s with %s packs' % (label, size), queries) as result:
+                    func()
+                counts[size] = result['queries']
+        self.assertEqual(len(set(counts.values())), 1, "%s: queries grow with the rule set %s" % (label, counts))
@@ -0,0 +1,58 @@
+from unittest.mock import patch
+
+from odoo import Command
+from odoo.modules.registry import Registry
+from odoo.tests import TransactionCase, new_test_user, tagged
+
+
+@tagged('post_install', '-at_install')
+class TestAccessGuard(TransactionCase):
+    """ Changes of the guard flags have to clear the registry cache, so that
+    the other workers drop their copy, whatever this worker has cached. """
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = new_test_user(cls.env, login='sam_guard_user', groups='base.group_user')
+        cls.category_model = cls.env['ir.model']._get('res.partner.category')
+
+    def _assert_cache_cleared(self, func):
+        # nothing cached: the guard is not looked up before the change
+        self.registry.clear_cache()
+        with patch.object(Registry, 'clear_cache', autospec=True, side_effect=Registry.clear_cache) as clear_cache:
+            func()
+        self.assertTrue(clear_cache.called, "the registry cache was not cleared")
+
+    def test_create_pack_with_domain(self):
+        self.assertNotIn('res.partner.category', self.env['access.management']._get_access_guard()['domain_models'])
+
+        def create():
+            self.env['access.management'].sudo().create({
+                'name': 'Guard pack',
+                'user_ids': [Command.set(self.user.ids)],
+                'access_domain_ah_ids': [Command.create({
+                    'model_id': self.category_model.id,
+                    'apply_domain': True,
+                    'read_right': True,
+                })],
+            })
+        self._assert_cache_cleared(create)
+
+    def test_write_pack_readonly(self):
+        pack = self.env['access.management'].sudo().create({
+            'name': 'Guard pack',
+            'user_ids': [Command.set(self.user.ids)],
+        })
+        self._assert_cache_cleared(lambda: pack.write({'readonly': True}))
+
+    def test_create_domain_line(self):
+        pack = self.env['access.management'].sudo().create({
+            'name': 'Guard pack',
+            'user_ids': [Command.set(self.user.ids)],
+        })
+        self._assert_cache_cleared(lambda: self.env['access.domain.ah'].sudo().create({
+            'access_management_id': pack.id,
+            'model_id': self.category_model.id,
+            'apply_domain': True,
+            'read_right': True,
+        }))
@@ -0,0 +1,34 @@
+from odoo.tests import HttpCase, tagged
+
+from .common import AccessBudgetCommon
+
+
+@tagged('post_install', '-at_install', 'access_budget')
+class TestControllerBudgets(AccessBudgetCommon, HttpCase):
+    """ Query budgets of the controllers overridden by the module,
+    the requests being served from warm registry caches. """
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls._setup_budget_data()
+
+    def setUp(self):
+        super().setUp()
+        self.authenticate(self.budget_user.login, self.budget_user.login)
+
+    def test_action_load(self):
+        def load():
+            self.make_jsonrpc_request('/web/action/load', {'action_id': 'base.action_partner_form'})
+        self._check_budget_per_size('/web/action/load', load, queries=12)
+
+    def test_export_get_fields(self):
+        def get_fields():
+            self.make_jsonrpc_request('/web/export/get_fields', {'model': 'res.partner', 'domain': []})
+        self._check_budget_per_size('/web/export/get_fields', get_fields, queries=15)
+
+    def test_web_client(self):
+        def web_client():
+            response = self.url_open('/odoo')
+            self.assertEqual(response.status_code, 200)
+        self._check_budget_per_size('/odoo', web_client, queries=40)
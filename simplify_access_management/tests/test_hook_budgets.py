@@ -0,0 +1,88 @@
+from odoo.tests import TransactionCase, tagged
+
+from .common import AccessBudgetCommon
+
+
+@tagged('post_install', '-at_install', 'access_budget')
+class TestHookBudgets(AccessBudgetCommon, TransactionCase):
+    """ Query budgets of the hooks run on every request. Warm
+    budgets are those of a request served from the registry caches, cold
+    ones those of the first request after a policy change. """
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls._setup_budget_data()
+
+    def test_ir_model_access_check(self):
+        def check():
+            access = self._user_env()['ir.model.access']
+            for mode in ('read', 'create', 'write', 'unlink'):
+                access.check('res.partner', mode)
+        self._check_budget_per_size('ir.model.access.check', check, queries=2)
+
+    def test_ir_rule_compute_domain(self):
+        def compute_domain():
+            self._user_env()['ir.rule']._compute_domain('res.partner', 'read')
+        self._check_budget_per_size('ir.rule._compute_domain', compute_domain, queries=2)
+        self._check_budget_per_size('ir.rule._compute_domain (cold)', compute_domain, queries=12, warm=False)
+
+    def test_check_records(self):
+        # the decisions of the transaction are dropped so that every run checks
+        def check(mode, count):
+            self.env.cr.precommit.data.pop('access_management.decisions', None)
+            self.partners[:count].with_env(self._user_env())._check_access_management_records(mode)
+        for mode in ('write', 'unlink'):
+            for count in (1, 20):
+                self._check_budget_per_size(
+                    '%s check of %s records' % (mode, count), lambda: check(mode, count), queries=4)
+
+    def test_create_write_unlink(self):
+        Partner = self._user_env()['res.partner']
+
+        def create():
+            Partner.create({'name': 'Budget create'})
+        self._check_budget_per_size('create', create, queries=12)
+
+        def write():
+            self.env.cr.precommit.data.pop('access_management.decisions', None)
+            self.partners.with_env(self._user_env()).write({'comment': 'Budget'})
+        self._check_budget_per_size('write', write, queries=12)
+
+        def unlink():
+            self.env.cr.precommit.data.pop('access_management.decisions', None)
+            Partner.create({'name': 'Budget unlink'}).unlink()
+        self._check_budget_per_size('unlink', unlink, queries=25)
+
+    def test_get_view(self):
+        # _get_view is not cached, the arch is postprocessed on every call
+        def get_view():
+            Partner = self._user_env()['res.partner']
+            for view_type in ('form', 'list', 'kanban', 'search'):
+                Partner._get_view(view_type=view_type)
+        self._check_budget_per_size('_get_view', get_view, queries=8)
+
+    def test_get_views(self):
+        def get_views():
+            self._user_env()['res.partner'].get_views(
+                [(False, 'form'), (False, 'list'), (False, 'search')], {'toolbar': True, 'load_filters': True})
+        self._check_budget_per_size('get_views', get_views, queries=6)
+        # cold: views postprocessed, _postprocess_tag_* hooks included
+        self._check_budget_per_size('get_views (cold)', get_views, queries=120, warm=False)
+
+    def test_postprocess_tags(self):
+        # the hooks read the node index, compiled once per model and policy
+        def postprocess():
+            Partner = self._user_env()['res.partner']
+            for view_type in ('form', 'list', 'search'):
+                arch, _view = Partner._get_view(view_type=view_type)
+                Partner.env['ir.ui.view'].postprocess_and_fields(arch, model='res.partner')
+        self._check_budget_per_size('_postprocess_tag_*', postprocess, queries=10)
+
+    def test_menus(self):
+        def menus():
+            Menu = self._user_env()['ir.ui.menu']
+            Menu.search([])
+            Menu.load_menus(debug=False)
+        self._check_budget_per_size('ir.ui.menu search/load_menus', menus, queries=2)
+        self._check_budget_per_size('ir.ui.menu search/load_menus (cold)', menus, queries=25, warm=False)